@@ -0,0 +1,164 @@
+"""
+このファイルではdataディレクトリ内の全てのwordファイルを1回の実行でまとめて校閲します。
+"""
+
+import os
+import time
+from change_log import ChangeLogWriter, ChangeRecordBuffer, replay_changes
+from make_xml_from_wordfile import get_docx_files
+from process import conversion_rules, worker_pool
+from part_cache import PartCache
+from profiler import profiler
+from paragraph_cache import ParagraphCache
+from proofread_in_memory import proofread_docx_stream
+from rule_engine import compile_rules
+
+# ワーカープロセスで使用するルール(ワーカーの起動時に_init_workerで設定する)
+_worker_rules = conversion_rules
+
+def get_output_path(docx_file, data_dir, output_dir):
+    """
+    入力ファイルに対応する出力ファイル(【校閲ずみ】〜.docx)のパスを返す
+    dataディレクトリ内のサブディレクトリ構成は出力先でも維持する
+    """
+    relative_dir = os.path.dirname(os.path.relpath(docx_file, data_dir))
+    core_filename = os.path.splitext(os.path.basename(docx_file))[0]
+    return os.path.join(output_dir, relative_dir, f"【校閲ずみ】{core_filename}.docx")
+
+def proofread_one(docx_file, output_docx, log_file, rules, stream, part_cache=None, incremental=False,
+                  coalesce=False, data_dir='data'):
+    """
+    1つのwordファイルを校閲し、結果をまとめた辞書を返す(失敗しても処理を止めない)
+    incremental=Trueの場合はpart_cacheのディレクトリに段落ごとの結果を保存し、変わった段落のみを校閲する
+    (段落ごとの結果は、data_dirからの相対パスで文書を区別して保存する)
+    coalesce=Trueの場合は各段落の変換の前に、書式が同じで隣り合うランを1つにまとめる
+    """
+    os.makedirs(os.path.dirname(output_docx) or '.', exist_ok=True)
+    paragraph_cache = None
+    if incremental and part_cache is not None:
+        paragraph_cache = ParagraphCache.for_document(part_cache.cache_dir, docx_file, compile_rules(rules).fingerprint,
+                                                      data_dir)
+    start = time.perf_counter()
+    try:
+        result = proofread_docx_stream(docx_file, output_docx, log_file, rules, stream=stream, part_cache=part_cache,
+                                       paragraph_cache=paragraph_cache, coalesce=coalesce)
+        if paragraph_cache is not None:
+            paragraph_cache.save()
+    except Exception as e:
+        # 壊れたzipファイル・XMLのほか、圧縮データの破損(zlib.error)・暗号化されたパーツ(RuntimeError)等も
+        # このファイルの失敗として記録し、残りのファイルの校閲を続ける
+        print(f"{docx_file} の校閲に失敗しました: {e}")
+        # 途中まで書き出した出力ファイルは残さない
+        if os.path.exists(output_docx):
+            os.remove(output_docx)
+        result = {'error': str(e)}
+    result.update(input=docx_file, output=output_docx, seconds=time.perf_counter() - start)
+    return result
+
+def _init_worker(rules):
+    """
+    ワーカープロセスの起動時に、使用するルールを設定してコンパイルしておく
+    """
+    global _worker_rules
+    _worker_rules = conversion_rules if rules is None else rules
+    compile_rules(_worker_rules)
+
+def _proofread_in_worker(task):
+    """
+    ワーカープロセスで1つのwordファイルを校閲する
+    ログは共有ファイルに書き込まず、変更記録のリストとして親プロセスへ返す
+    校閲に失敗した場合も例外は送出せず、{'error': 内容}を含む結果を返す
+    """
+    docx_file, output_docx, stream, cache_dir, incremental, coalesce, data_dir = task
+    log_file = ChangeRecordBuffer()
+    try:
+        part_cache = PartCache(cache_dir) if cache_dir else None
+        result = proofread_one(docx_file, output_docx, log_file, _worker_rules, stream, part_cache, incremental,
+                               coalesce, data_dir)
+    except Exception as e:
+        # 例外を親プロセスへ送ると並列処理全体が止まるため、このファイルの失敗として返す
+        print(f"{docx_file} の校閲に失敗しました: {e}")
+        result = {'error': str(e), 'input': docx_file, 'output': output_docx, 'seconds': 0.0}
+    return result, log_file.records
+
+def format_summary(results):
+    """
+    文書ごとの結果を集計した要約の行を返す
+    """
+    lines = ["===== 校閲結果の要約 ====="]
+    total_changed = 0
+    total_rule_counts = {}
+    for result in results:
+        if 'error' in result:
+            lines.append(f"{result['input']}: 失敗 ({result['error']})")
+            continue
+        total_changed += result['nodes_changed']
+        lines.append(
+            f"{result['input']} -> {result['output']}: "
+            f"変更 {result['nodes_changed']} / 省略 {result['nodes_skipped']} / 判定 {result['nodes_checked']} ノード, "
+            f"{result['seconds']:.2f} 秒")
+        for name, count in result['rule_counts'].items():
+            lines.append(f"    {name}: {count}")
+            total_rule_counts[name] = total_rule_counts.get(name, 0) + count
+    failed = sum(1 for result in results if 'error' in result)
+    lines.append(f"合計: {len(results)} ファイル (失敗 {failed}), 変更 {total_changed} ノード")
+    if total_rule_counts:
+        lines.append("ルールごとの変更数(全ファイル):")
+        for name, count in sorted(total_rule_counts.items(), key=lambda item: -item[1]):
+            lines.append(f"    {name}: {count}")
+    unchanged = sum(1 for result in results if result.get('parts_modified') == 0)
+    if unchanged:
+        lines.append(f"変更箇所がなく、元のファイルを複製したファイル: {unchanged}")
+    runs_checked = sum(result.get('runs_checked', 0) for result in results)
+    if runs_checked:
+        runs_removed = sum(result.get('runs_removed', 0) for result in results)
+        texts_removed = sum(result.get('texts_removed', 0) for result in results)
+        lines.append(f"ランの統合: {runs_checked} → {runs_checked - runs_removed} ラン(<w:t>要素 {texts_removed} 個を削減)")
+    cache_hits = sum(result.get('cache_hits', 0) for result in results)
+    lookups = cache_hits + sum(result.get('cache_misses', 0) for result in results)
+    if lookups:
+        lines.append(f"変換結果キャッシュ: ヒット {cache_hits} / {lookups} (ヒット率 {cache_hits / lookups:.1%})")
+    if any('part_cache_hits' in result for result in results):
+        lines.append(f"パーツキャッシュから再利用したパーツ: {sum(result.get('part_cache_hits', 0) for result in results)}")
+    return lines
+
+def proofread_batch(docx_files, data_dir, output_dir, log_filename, rules=conversion_rules, stream=False, jobs=1,
+                    part_cache=None, incremental=False, log_format='text', coalesce=False):
+    """
+    複数のwordファイルを校閲し、文書ごとの結果を返す
+    jobs=1の場合は1つのプロセス内で順に処理し、コンパイル済みのルールを全ての文書で共有する
+    jobs>1の場合はプロセスプールで並列に処理し、ログと結果は入力順にまとめる
+    log_format='jsonl'の場合は変更記録を1行1件のJSONでログに書き込む
+    coalesce=Trueの場合は各段落の変換の前に、書式が同じで隣り合うランを1つにまとめる
+    ワーカーにルールを渡せない場合(process.worker_contextを参照)は、jobsによらず順に処理する
+    """
+    results = []
+    # プロセスプールはログを書き込むスレッドより先に作成する
+    with worker_pool(rules, min(jobs, len(docx_files)), _init_worker) as pool, \
+            ChangeLogWriter(log_filename, log_format) as log_file:
+        if pool is not None:
+            cache_dir = part_cache.cache_dir if part_cache else None
+            tasks = [(docx_file, get_output_path(docx_file, data_dir, output_dir), stream, cache_dir, incremental,
+                      coalesce, data_dir) for docx_file in docx_files]
+            with profiler.stage('batch_parallel'):
+                # imapは入力順に結果を返すため、ログの順序は実行ごとに変わらない
+                for task, (result, records) in zip(tasks, pool.imap(_proofread_in_worker, tasks)):
+                    log_file.write(f"=== {task[0]} ===\n")
+                    replay_changes(log_file, records)
+                    results.append(result)
+        else:
+            for docx_file in docx_files:
+                output_docx = get_output_path(docx_file, data_dir, output_dir)
+                log_file.write(f"=== {docx_file} ===\n")
+                results.append(proofread_one(docx_file, output_docx, log_file, rules, stream, part_cache, incremental,
+                                             coalesce, data_dir))
+
+        summary = format_summary(results)
+        log_file.write('\n'.join(summary) + '\n')
+    print('\n'.join(summary))
+    return results
+
+
+if __name__ == "__main__":
+    docx_files = get_docx_files("data")
+    proofread_batch(docx_files, "data", ".", 'conversion_rules_log.txt')
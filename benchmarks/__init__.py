@@ -0,0 +1,5 @@
+"""
+校閲処理の性能を測定するためのベンチマークです。
+
+合成したwordファイルを生成し(synthetic_docx)、main.pyの処理の各段階にかかる時間を測定します(run_benchmarks)。
+"""
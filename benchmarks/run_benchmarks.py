@@ -0,0 +1,160 @@
+"""
+このファイルではmain.pyの処理(展開・解析・変換・書き出し・再構成)の段階ごとの処理時間を測定します。
+リポジトリのルートで python -m benchmarks.run_benchmarks のように実行します。
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+from lxml import etree as ET
+from benchmarks.synthetic_docx import add_corpus_arguments, corpus_options, generate_docx
+from change_log import ChangeLogWriter
+from coalesce_runs import coalesce_runs
+from docx_parts import find_proofread_parts_in_dir
+from make_xml_from_wordfile import extract_docx_to_xml
+from process import conversion_rules, namespaces, process_runs_in_paragraph, read_xml_prolog, serialize_tree
+from remake_wordfile_from_xml import create_docx
+from rule_engine import compile_rules, conversion_cache
+
+STAGES = ['extract_docx_to_xml', 'parse', 'coalesce_runs', 'process_runs_in_paragraph', 'tree.write', 'create_docx']
+
+def run_pipeline(docx_file, work_dir, rules=conversion_rules, coalesce=False):
+    """
+    main.pyの展開・校閲・再構成を1回実行し、段階ごとの処理時間(秒)と処理量を返す
+    coalesce=Trueの場合は校閲の前にランの統合(coalesce_runs)も測定する
+    """
+    xml_dir = os.path.join(work_dir, 'xml_new')
+    output_docx = os.path.join(work_dir, 'output.docx')
+    timings = {}
+
+    start = time.perf_counter()
+    # 展開時のメッセージは測定結果の表示の妨げになるため表示しない
+    with contextlib.redirect_stdout(io.StringIO()):
+        extract_docx_to_xml(docx_file, xml_dir)
+    timings['extract_docx_to_xml'] = time.perf_counter() - start
+
+    part_names = find_proofread_parts_in_dir(xml_dir)
+    file_paths = [os.path.join(xml_dir, *name.split('/')) for name in part_names]
+    xml_bytes = sum(os.path.getsize(file_path) for file_path in file_paths)
+
+    start = time.perf_counter()
+    trees = [ET.parse(file_path) for file_path in file_paths]
+    timings['parse'] = time.perf_counter() - start
+
+    paragraphs = [tree.getroot().findall('.//w:p', namespaces) for tree in trees]
+    paragraph_count = sum(len(part_paragraphs) for part_paragraphs in paragraphs)
+    if coalesce:
+        start = time.perf_counter()
+        for part_paragraphs in paragraphs:
+            for paragraph in part_paragraphs:
+                coalesce_runs(paragraph)
+        timings['coalesce_runs'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ChangeLogWriter(os.path.join(work_dir, 'conversion_rules_log.txt')) as log_file:
+        for part_paragraphs in paragraphs:
+            for paragraph_index, paragraph in enumerate(part_paragraphs):
+                process_runs_in_paragraph(paragraph, log_file, rules, paragraph_index=paragraph_index)
+    timings['process_runs_in_paragraph'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for tree, file_path in zip(trees, file_paths):
+        data = serialize_tree(tree, read_xml_prolog(file_path))
+        with open(file_path, 'wb') as f:
+            f.write(data)
+    timings['tree.write'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    create_docx(xml_dir, output_docx, source_docx=docx_file, modified_parts=part_names)
+    timings['create_docx'] = time.perf_counter() - start
+
+    volumes = {
+        'extract_docx_to_xml': os.path.getsize(docx_file),
+        'parse': xml_bytes,
+        'coalesce_runs': xml_bytes,
+        'process_runs_in_paragraph': xml_bytes,
+        'tree.write': xml_bytes,
+        'create_docx': os.path.getsize(output_docx),
+    }
+    return timings, volumes, paragraph_count
+
+def benchmark(docx_file, repeat=3, rules=conversion_rules, coalesce=False):
+    """
+    run_pipelineをrepeat回実行し、段階ごとの処理時間の中央値とスループットを返す
+    変換結果キャッシュは毎回空にし、どの回も同じ条件で測定する
+    """
+    engine = compile_rules(rules)
+    cache_size = conversion_cache.maxsize
+    runs = []
+    for _ in range(repeat):
+        conversion_cache.resize(0)
+        conversion_cache.resize(cache_size)
+        engine.reset_stats()
+        with tempfile.TemporaryDirectory() as work_dir:
+            runs.append(run_pipeline(docx_file, work_dir, rules, coalesce))
+
+    volumes, paragraph_count = runs[0][1], runs[0][2]
+    results = []
+    for stage in (stage for stage in STAGES if stage in runs[0][0]):
+        seconds = statistics.median(timings[stage] for timings, _, _ in runs)
+        results.append({
+            'stage': stage,
+            'seconds': seconds,
+            'paragraphs_per_sec': paragraph_count / seconds if seconds else None,
+            'mb_per_sec': volumes[stage] / (1 << 20) / seconds if seconds else None,
+            'bytes': volumes[stage],
+        })
+    total = sum(result['seconds'] for result in results)
+    results.append({
+        'stage': 'total',
+        'seconds': total,
+        'paragraphs_per_sec': paragraph_count / total if total else None,
+        'mb_per_sec': os.path.getsize(docx_file) / (1 << 20) / total if total else None,
+        'bytes': os.path.getsize(docx_file),
+    })
+    return {'docx': docx_file, 'paragraphs': paragraph_count, 'repeat': repeat, 'stages': results}
+
+def format_report(report):
+    """
+    測定結果を表形式の行にする
+    """
+    lines = [f"{report['docx']}: 段落 {report['paragraphs']} / {report['repeat']} 回の中央値",
+             f"{'段階':<28}{'秒':>10}{'段落/秒':>14}{'MB/秒':>10}"]
+    for result in report['stages']:
+        paragraphs_per_sec = f"{result['paragraphs_per_sec']:.0f}" if result['paragraphs_per_sec'] else '-'
+        mb_per_sec = f"{result['mb_per_sec']:.1f}" if result['mb_per_sec'] else '-'
+        lines.append(f"{result['stage']:<28}{result['seconds']:>10.3f}{paragraphs_per_sec:>14}{mb_per_sec:>10}")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description="校閲処理の段階ごとの処理時間を測定します。")
+    parser.add_argument('--docx', help="測定に使用する.docxファイル(省略時は合成ファイルを生成する)")
+    parser.add_argument('--repeat', type=int, default=3, help="測定の回数(中央値を表示する)")
+    parser.add_argument('--json', metavar='FILE', help="測定結果をJSONで保存するファイル")
+    parser.add_argument('--coalesce-runs', action='store_true', help="校閲の前にランの統合を行い、その時間も測定する")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        docx_file = args.docx
+        if docx_file is None:
+            docx_file = os.path.join(corpus_dir, 'synthetic.docx')
+            generate_docx(docx_file, **corpus_options(args))
+        report = benchmark(docx_file, repeat=args.repeat, coalesce=args.coalesce_runs)
+        if args.docx is None:
+            report['corpus'] = corpus_options(args)
+            report['docx'] = 'synthetic.docx'
+
+    print('\n'.join(format_report(report)))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
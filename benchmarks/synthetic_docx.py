@@ -0,0 +1,186 @@
+"""
+このファイルではベンチマーク用に、大きさと内容の構成を指定した合成のwordファイルを生成します。
+同じ引数(シード値を含む)からは常に同じファイルが生成されます。
+"""
+
+import argparse
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+RELATIONSHIP_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# 校閲の対象とならない日本語の文
+JAPANESE_TEXTS = [
+    'この文書は校閲処理の性能を測定するために生成されました。',
+    '本文には全角と半角の文字が混在しています。',
+    '各段落は複数のランで構成されています。',
+    '担当者は内容を確認してください。',
+    '以下の手順に従って設定を行います。',
+]
+
+# 校閲で変換される全角英数字・記号を含む文字列
+FULLWIDTH_TEXTS = ['ＡＢＣ', '１２３', '（ａｂｃ）', 'Ｗｏｒｄ', '２０２４年', '＆', '［注］', '１０％']
+
+# 校閲で変換されない半角英数字の文字列
+HALFWIDTH_TEXTS = ['ABC', '123', 'Word', '2024年', 'version 1', 'API']
+
+# 画像として埋め込むデータの1ファイルあたりの最大サイズ
+MEDIA_CHUNK_SIZE = 1 << 20
+
+# 生成するファイルを実行日時によらず同一にするため、格納するパーツの日時は固定する
+PART_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+def make_run_text(rng, fullwidth_ratio):
+    """
+    1つのランのテキストを生成する
+    fullwidth_ratioの確率で全角英数字・記号を、それ以外は半角英数字を日本語の文に挿入する
+    """
+    text = rng.choice(JAPANESE_TEXTS)
+    inserted = rng.choice(FULLWIDTH_TEXTS if rng.random() < fullwidth_ratio else HALFWIDTH_TEXTS)
+    position = rng.randrange(len(text))
+    return text[:position] + inserted + text[position:]
+
+def make_paragraph(rng, runs_per_paragraph, fullwidth_ratio, fragments=1):
+    """
+    1つの段落(w:p)のXMLを生成する
+    fragments>1の場合は、編集を繰り返した文書のように1つのランのテキストを
+    書式が同じで編集履歴の識別子(w:rsidR)のみが異なるfragments個のランに分割する
+    """
+    runs = []
+    for _ in range(runs_per_paragraph):
+        rsids = [f'{rng.randrange(1 << 32):08X}']
+        text = make_run_text(rng, fullwidth_ratio)
+        rsids += [f'{rng.randrange(1 << 32):08X}' for _ in range(fragments - 1)]
+        size = -(-len(text) // fragments)
+        for rsid, start in zip(rsids, range(0, len(text), size)):
+            runs.append(f'<w:r w:rsidR="{rsid}"><w:rPr><w:rFonts w:hint="eastAsia"/></w:rPr>'
+                        f'<w:t xml:space="preserve">{escape(text[start:start + size])}</w:t></w:r>')
+    return f'<w:p>{"".join(runs)}</w:p>'
+
+def make_document_xml(rng, paragraphs, runs_per_paragraph, fullwidth_ratio, footers, fragments=1):
+    """
+    本文(document.xml)を生成する
+    """
+    body = ''.join(make_paragraph(rng, runs_per_paragraph, fullwidth_ratio, fragments) for _ in range(paragraphs))
+    references = ''.join(f'<w:footerReference w:type="default" r:id="rIdFooter{i}"/>' for i in range(1, footers + 1))
+    return (f'{XML_DECLARATION}<w:document xmlns:w="{W_NS}" xmlns:r="{R_NS}"><w:body>{body}'
+            f'<w:sectPr>{references}</w:sectPr></w:body></w:document>')
+
+def make_footer_xml(rng, runs_per_paragraph, fullwidth_ratio):
+    """
+    フッター(footerN.xml)を生成する
+    """
+    return f'{XML_DECLARATION}<w:ftr xmlns:w="{W_NS}">{make_paragraph(rng, runs_per_paragraph, fullwidth_ratio)}</w:ftr>'
+
+def make_content_types_xml(footers, media_files):
+    """
+    [Content_Types].xmlを生成する
+    """
+    overrides = ['<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.'
+                 'wordprocessingml.document.main+xml"/>']
+    for i in range(1, footers + 1):
+        overrides.append(f'<Override PartName="/word/footer{i}.xml" ContentType="application/vnd.openxmlformats-'
+                         f'officedocument.wordprocessingml.footer+xml"/>')
+    media_default = '<Default Extension="png" ContentType="image/png"/>' if media_files else ''
+    return (f'{XML_DECLARATION}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            f'<Default Extension="xml" ContentType="application/xml"/>{media_default}{"".join(overrides)}</Types>')
+
+def make_relationships_xml(relationships):
+    """
+    (Id, 種別, 参照先)のリストから.relsファイルを生成する
+    """
+    items = ''.join(f'<Relationship Id="{rid}" Type="{RELATIONSHIP_TYPE}/{kind}" Target="{target}"/>'
+                    for rid, kind, target in relationships)
+    return (f'{XML_DECLARATION}<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{items}</Relationships>')
+
+def write_part(docx, name, data, compress_type=zipfile.ZIP_DEFLATED):
+    """
+    日時を固定してパーツを格納する
+    """
+    info = zipfile.ZipInfo(name, date_time=PART_DATE_TIME)
+    info.compress_type = compress_type
+    docx.writestr(info, data)
+
+def generate_docx(output_docx, paragraphs=1000, runs_per_paragraph=4, fullwidth_ratio=0.3, footers=1, media_bytes=0,
+                  seed=0, fragments=1):
+    """
+    合成のwordファイルを生成し、その構成を辞書で返す
+    paragraphs: 本文の段落数
+    runs_per_paragraph: 1段落あたりのラン数
+    fullwidth_ratio: 全角英数字・記号(校閲で変換される文字列)を含むランの割合
+    footers: フッターの数
+    media_bytes: 埋め込む画像データの合計サイズ(圧縮できないデータを1MBずつのファイルに分けて格納する)
+    fragments: 本文の1つのランを、編集履歴の識別子のみが異なるいくつのランに分割するか
+    """
+    rng = random.Random(seed)
+    media_sizes = [MEDIA_CHUNK_SIZE] * (media_bytes // MEDIA_CHUNK_SIZE)
+    if media_bytes % MEDIA_CHUNK_SIZE:
+        media_sizes.append(media_bytes % MEDIA_CHUNK_SIZE)
+
+    document_xml = make_document_xml(rng, paragraphs, runs_per_paragraph, fullwidth_ratio, footers,
+                                     fragments).encode('utf-8')
+    footer_xmls = [make_footer_xml(rng, runs_per_paragraph, fullwidth_ratio).encode('utf-8') for _ in range(footers)]
+    document_relationships = [(f'rIdFooter{i}', 'footer', f'footer{i}.xml') for i in range(1, footers + 1)]
+    document_relationships += [(f'rIdImage{i}', 'image', f'media/image{i}.png') for i in range(1, len(media_sizes) + 1)]
+
+    with zipfile.ZipFile(output_docx, 'w') as docx:
+        write_part(docx, '[Content_Types].xml', make_content_types_xml(footers, len(media_sizes)))
+        write_part(docx, '_rels/.rels', make_relationships_xml([('rId1', 'officeDocument', 'word/document.xml')]))
+        write_part(docx, 'word/document.xml', document_xml)
+        write_part(docx, 'word/_rels/document.xml.rels', make_relationships_xml(document_relationships))
+        for i, footer_xml in enumerate(footer_xmls, 1):
+            write_part(docx, f'word/footer{i}.xml', footer_xml)
+        for i, size in enumerate(media_sizes, 1):
+            # 画像は圧縮済みの形式のため、圧縮せずに格納する
+            write_part(docx, f'word/media/image{i}.png', rng.randbytes(size), compress_type=zipfile.ZIP_STORED)
+
+    return {
+        'paragraphs': paragraphs + footers,
+        'runs': (paragraphs + footers) * runs_per_paragraph,
+        'xml_bytes': len(document_xml) + sum(len(footer_xml) for footer_xml in footer_xmls),
+        'media_bytes': media_bytes,
+    }
+
+def add_corpus_arguments(parser):
+    """
+    合成ファイルの構成を指定するコマンドライン引数を追加する
+    """
+    parser.add_argument('--paragraphs', type=int, default=1000, help="本文の段落数")
+    parser.add_argument('--runs-per-paragraph', type=int, default=4, help="1段落あたりのラン数")
+    parser.add_argument('--fullwidth-ratio', type=float, default=0.3,
+                        help="全角英数字・記号(校閲で変換される文字列)を含むランの割合(0〜1)")
+    parser.add_argument('--footers', type=int, default=1, help="フッターの数")
+    parser.add_argument('--media-mb', type=float, default=0, help="埋め込む画像データの合計サイズ(MB)")
+    parser.add_argument('--seed', type=int, default=0, help="乱数のシード値(同じ値からは同じファイルを生成する)")
+    parser.add_argument('--fragments', type=int, default=1,
+                        help="本文の1つのランを、編集履歴の識別子(w:rsidR)のみが異なるいくつのランに分割するか")
+
+def corpus_options(args):
+    """
+    コマンドライン引数からgenerate_docxの引数を作成する
+    """
+    return {
+        'paragraphs': args.paragraphs,
+        'runs_per_paragraph': args.runs_per_paragraph,
+        'fullwidth_ratio': args.fullwidth_ratio,
+        'footers': args.footers,
+        'media_bytes': int(args.media_mb * (1 << 20)),
+        'seed': args.seed,
+        'fragments': args.fragments,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成wordファイルを生成します。")
+    parser.add_argument('output', help="出力する.docxファイル")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+    shape = generate_docx(args.output, **corpus_options(args))
+    print(f"{args.output} を生成しました: 段落 {shape['paragraphs']} / ラン {shape['runs']} / "
+          f"XML {shape['xml_bytes'] / (1 << 20):.1f} MB / 画像 {shape['media_bytes'] / (1 << 20):.1f} MB")
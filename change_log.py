@@ -0,0 +1,185 @@
+"""
+このファイルでは校閲による変更内容を構造化された記録として扱い、ログファイルへ書き込みます。
+"""
+
+import json
+import queue
+import threading
+
+def changed_span(before, after):
+    """
+    変更前のテキストのうち、変更された範囲(開始位置, 終了位置)を返す
+    """
+    start = 0
+    limit = min(len(before), len(after))
+    while start < limit and before[start] == after[start]:
+        start += 1
+    end = len(before)
+    after_end = len(after)
+    while end > start and after_end > start and before[end - 1] == after[after_end - 1]:
+        end -= 1
+        after_end -= 1
+    return start, end
+
+def make_change_record(paragraph_index, run_index, t_index, before, after, matches):
+    """
+    1つのテキストノードの変更記録を作成する
+    matchesはルールごとの変更箇所(CompiledRules.describe_matchesの結果)
+    """
+    start, end = changed_span(before, after)
+    return {'type': 'change', 'paragraph': paragraph_index, 'run': run_index, 'text': t_index,
+            'start': start, 'end': end, 'rules': sorted({match['rule'] for match in matches}),
+            'matches': matches, 'before': before, 'after': after}
+
+def make_rule_counts_record(rule_counts):
+    """
+    文書内のルールごとの変更数(ルール名: 変更箇所数)の記録を作成する
+    """
+    return {'type': 'rule_counts', 'counts': rule_counts}
+
+def format_change_text(record):
+    """
+    変更記録をテキスト形式のログ行に変換する
+    """
+    rule_names = '、'.join(dict.fromkeys(match['name'] for match in record['matches']))
+    return f"対象テキスト: '{record['before']}', 適用ルール: '{rule_names}', 適用後テキスト: '{record['after']}'\n"
+
+def format_rule_counts_text(record):
+    """
+    ルールごとの変更数の記録をテキスト形式のログ行に変換する
+    """
+    counts = ', '.join(f"{name}: {count}" for name, count in record['counts'].items())
+    return f"ルールごとの変更数: {counts}\n"
+
+def format_record_text(record):
+    """
+    記録の種類に応じてテキスト形式のログ行に変換する
+    """
+    if record['type'] == 'rule_counts':
+        return format_rule_counts_text(record)
+    return format_change_text(record)
+
+def write_change(log_file, record):
+    """
+    変更記録をログに書き込む
+    ChangeLogWriter・ChangeRecordBufferには記録のまま、通常のファイルにはテキスト形式で書き込む
+    """
+    if hasattr(log_file, 'write_record'):
+        log_file.write_record(record)
+    else:
+        log_file.write(format_record_text(record))
+
+def replay_changes(log_file, records, **overrides):
+    """
+    ChangeRecordBufferやキャッシュに保存した変更記録を、別のログへ書き込む
+    """
+    for record in records:
+        write_change(log_file, {**record, **overrides} if overrides else record)
+
+def set_log_context(log_file, **context):
+    """
+    以降の変更記録に付与する文書名・パーツ名を設定する(Noneを指定した項目は付与しない)
+    対応していないログでは何もしない
+    """
+    if hasattr(log_file, 'context'):
+        for name, value in context.items():
+            if value is None:
+                log_file.context.pop(name, None)
+            else:
+                log_file.context[name] = value
+
+class ChangeRecordBuffer:
+    """
+    変更記録をメモリ上に溜めておくログ(並列処理・キャッシュ保存用)
+    """
+
+    def __init__(self):
+        self.records = []
+        self.context = {}
+
+    def write_record(self, record):
+        self.records.append({**self.context, **record} if self.context else record)
+
+    def write(self, text):
+        # 変更記録以外のテキストは保存しない
+        pass
+
+class ChangeLogWriter:
+    """
+    変更記録を専用のスレッドでシリアライズし、バッファリングしてファイルへ書き込むログ
+    校閲処理側は記録をキューへ渡すだけなので、書き込み待ちで処理が止まらない
+    """
+
+    def __init__(self, filename, log_format='text', batch_size=512, buffer_size=1 << 20):
+        if log_format not in ('text', 'jsonl'):
+            raise ValueError(f"未対応のログ形式です: {log_format}")
+        self.log_format = log_format
+        self.context = {}
+        self._batch_size = batch_size
+        self._pending = []
+        self._queue = queue.SimpleQueue()
+        self._error = None
+        self._file = open(filename, 'w', encoding='utf-8', buffering=buffer_size)
+        self._thread = threading.Thread(target=self._run, name='change-log-writer', daemon=True)
+        self._thread.start()
+
+    def write_record(self, record):
+        """
+        変更記録を書き込む(文書名・パーツ名などのコンテキストを付与する)
+        """
+        self._append({**self.context, **record} if self.context else record)
+
+    def write(self, text):
+        """
+        変更記録以外のテキスト(見出し・要約など)を書き込む
+        """
+        if self.log_format == 'jsonl':
+            self._append({'type': 'message', 'text': text.rstrip('\n')})
+        else:
+            self._append(text)
+
+    def _append(self, item):
+        self._pending.append(item)
+        if len(self._pending) >= self._batch_size:
+            self._flush_pending()
+
+    def _flush_pending(self):
+        if self._pending:
+            self._queue.put(self._pending)
+            self._pending = []
+
+    def _format(self, item):
+        if isinstance(item, str):
+            return item
+        if self.log_format == 'jsonl':
+            return json.dumps(item, ensure_ascii=False) + '\n'
+        return format_record_text(item)
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                break
+            if self._error is not None:
+                continue
+            try:
+                self._file.write(''.join(self._format(item) for item in batch))
+            except (OSError, TypeError, ValueError) as e:
+                self._error = e
+
+    def close(self):
+        """
+        溜まっている記録を全て書き込み、スレッドとファイルを閉じる
+        """
+        self._flush_pending()
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,175 @@
+"""
+このファイルでは校閲の前処理として、書式が同じで隣り合う<w:r>要素を1つにまとめます。
+編集を繰り返した文書では、書式が同じでも編集履歴の識別子(w:rsidR等)だけが異なるランに細かく分割されているため、
+まとめることで以降の変換・ハイライト・書き出しで扱う要素数を減らせます。
+"""
+
+from lxml import etree as ET
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+PARAGRAPH_TAG = f'{{{W_NS}}}p'
+RUN_TAG = f'{{{W_NS}}}r'
+RPR_TAG = f'{{{W_NS}}}rPr'
+TEXT_TAG = f'{{{W_NS}}}t'
+PROOF_ERR_TAG = f'{{{W_NS}}}proofErr'
+# 編集履歴の識別子の属性(w:rsidR・w:rsidRPr・w:rsidDel等)
+RSID_PREFIX = f'{{{W_NS}}}rsid'
+
+# まとめてよいランの子要素(テキスト・タブ・改行等)
+# フィールド・図・脚注参照等を含むランは、分割位置に意味があるためまとめない
+MERGEABLE_CHILD_TAGS = frozenset(f'{{{W_NS}}}{name}' for name in (
+    'rPr', 't', 'tab', 'br', 'cr', 'noBreakHyphen', 'softHyphen', 'lastRenderedPageBreak'))
+
+def mergeable_children(run):
+    """
+    ランの子要素のリスト・それぞれのタグのリスト・<w:rPr>要素(ない場合はNone)を返す
+    まとめられない子要素を含むランの場合はNoneを返す
+    """
+    children = list(run)
+    tags = [child.tag for child in children]
+    if not MERGEABLE_CHILD_TAGS.issuperset(tags):
+        return None
+    return children, tags, children[tags.index(RPR_TAG)] if RPR_TAG in tags else None
+
+def format_attributes(run):
+    """
+    ランの属性のうち、編集履歴の識別子(w:rsidR等)を除いたものを返す
+    """
+    return [item for item in run.items() if not item[0].startswith(RSID_PREFIX)]
+
+def rpr_signature(rpr):
+    """
+    <w:rPr>要素の内容を比較するための値(属性と、子要素ごとのタグ・属性・テキスト)を返す
+    子要素がさらに子要素を持つ場合(書式の変更履歴等)のみ、シリアライズした結果を返す
+    """
+    signature = [rpr.items()]
+    for child in rpr:
+        if len(child):
+            return ET.tostring(rpr, with_tail=False)
+        signature.append((child.tag, child.items(), child.text))
+    return signature
+
+class _MergedRun:
+    """
+    後続のランをまとめていく先頭のラン
+    書式の比較に使う属性と<w:rPr>の内容は、後続のランと比較する時点で1回だけ求める
+    末尾の<w:t>要素に連結するテキストは、まとめ終えた時点で1回だけ設定する
+    """
+
+    def __init__(self, run, children, tags, rpr):
+        self.run = run
+        self.rpr = rpr
+        self.rpr_length = len(rpr) if rpr is not None else 0
+        self.attributes = None
+        self.signature = None
+        self.last_text = children[-1] if tags and tags[-1] == TEXT_TAG else None
+        self.pieces = None
+        self.preserve = False
+
+    def same_format(self, run, rpr):
+        """
+        runの書式(編集履歴の識別子を除いた属性と<w:rPr>の内容)が先頭のランと同じかどうかを返す
+        <w:rPr>の有無と子要素の数、属性の順に安価な比較で異なるものを除いてから、<w:rPr>の内容を比較する
+        """
+        if rpr is None or self.rpr is None:
+            if rpr is not self.rpr:
+                return False
+        elif len(rpr) != self.rpr_length:
+            return False
+        if self.attributes is None:
+            self.attributes = format_attributes(self.run)
+        if format_attributes(run) != self.attributes:
+            return False
+        if rpr is None:
+            return True
+        if self.signature is None:
+            self.signature = rpr_signature(self.rpr)
+        return rpr_signature(rpr) == self.signature
+
+    def append(self, children, tags):
+        """
+        後続のランの子要素(<w:rPr>以外)を末尾に移し、1つにまとめた<w:t>要素の数を返す
+        """
+        merged = 0
+        for child, tag in zip(children, tags):
+            if tag == RPR_TAG:
+                continue
+            if tag == TEXT_TAG and self.last_text is not None:
+                if self.pieces is None:
+                    self.pieces = [self.last_text.text or '']
+                self.pieces.append(child.text or '')
+                self.preserve = self.preserve or child.get(XML_SPACE) == 'preserve'
+                merged += 1
+                continue
+            self.flush()
+            self.run.append(child)
+            self.last_text = child if tag == TEXT_TAG else None
+        return merged
+
+    def flush(self):
+        """
+        連結したテキストを末尾の<w:t>要素に設定する
+        """
+        if self.pieces is None:
+            return
+        text = ''.join(self.pieces)
+        self.last_text.text = text
+        if self.preserve or text != text.strip():
+            self.last_text.set(XML_SPACE, 'preserve')
+        self.pieces = None
+        self.preserve = False
+
+def nested_run_parents(paragraph, element):
+    """
+    段落の子要素(ハイパーリンク・変更履歴等)のうち、段落に属するランを子要素として持つ要素を返す
+    """
+    parents = []
+    for run in element.iter(RUN_TAG):
+        parent = run.getparent()
+        if parent not in parents and next(run.iterancestors(PARAGRAPH_TAG)) is paragraph:
+            parents.append(parent)
+    return parents
+
+def coalesce_runs(paragraph):
+    """
+    段落内で隣り合い、書式が同じ<w:r>要素を1つにまとめ、統計(判定したラン数・削除したラン数・削除した<w:t>要素数)を返す
+    まとめるランの間にあるスペルチェックの状態を表す<w:proofErr>要素は、ランと一緒に削除する
+    テキストボックス等の入れ子の段落は、その段落を処理する際にまとめる
+    """
+    stats = {'runs_checked': 0, 'runs_removed': 0, 'texts_removed': 0}
+    parents = [paragraph]
+    for parent in parents:
+        merged_run = None
+        last = 0        # まとめていくランのうち最後のランの位置
+        removed = []    # 削除する子要素の範囲(開始位置, 終了位置)
+        for i, child in enumerate(parent):
+            tag = child.tag
+            if tag == PROOF_ERR_TAG:
+                continue
+            found = None
+            if tag == RUN_TAG:
+                stats['runs_checked'] += 1
+                found = mergeable_children(child)
+            elif parent is paragraph and len(child):
+                # ハイパーリンク等の中のランは、段落の子要素を処理し終えた後にまとめる
+                parents.extend(nested_run_parents(paragraph, child))
+            if found is not None and merged_run is not None and merged_run.same_format(child, found[2]):
+                stats['texts_removed'] += merged_run.append(found[0], found[1])
+                stats['runs_removed'] += 1
+                # 直前にまとめたランとの間の<w:proofErr>要素も含めて削除する
+                if removed and removed[-1][1] == last + 1:
+                    removed[-1][1] = i + 1
+                else:
+                    removed.append([last + 1, i + 1])
+                last = i
+                continue
+            if merged_run is not None:
+                merged_run.flush()
+            merged_run = _MergedRun(child, *found) if found is not None else None
+            last = i
+        if merged_run is not None:
+            merged_run.flush()
+        for start, end in reversed(removed):
+            del parent[start:end]
+    return stats
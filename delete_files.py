@@ -4,8 +4,13 @@
 
 import os
 import shutil
+from make_xml_from_wordfile import get_docx_file
 
-def delete_files_and_directories():
+def delete_files_and_directories(core_filename):
+    """
+    展開したXML・ログ・出力ファイル(【校閲ずみ】{core_filename}.docx)・dataディレクトリ内のファイルを削除する
+    core_filenameがNoneの場合は出力ファイルを削除しない
+    """
     # 削除対象のディレクトリとファイル
     directories = ['xml', 'xml_new']
     files = ['conversion_rules_log.txt']
@@ -27,12 +32,13 @@ def delete_files_and_directories():
             print(f"ファイル '{file}' は存在しません。")
 
     # 出力ファイルの削除
-    output_docx = f"【校閲ずみ】{core_filename}.docx"
-    if os.path.exists(output_docx):
-        os.remove(output_docx)
-        print(f"ファイル '{output_docx}' を削除しました。")
-    else:
-        print(f"ファイル '{output_docx}' は存在しません。")
+    if core_filename is not None:
+        output_docx = f"【校閲ずみ】{core_filename}.docx"
+        if os.path.exists(output_docx):
+            os.remove(output_docx)
+            print(f"ファイル '{output_docx}' を削除しました。")
+        else:
+            print(f"ファイル '{output_docx}' は存在しません。")
 
     # dataディレクトリ内のファイルを削除
     data_directory = 'data'
@@ -47,10 +53,11 @@ def delete_files_and_directories():
     else:
         print(f"ディレクトリ '{data_directory}' は存在しません。")
 
-# パスの設定
-from make_xml_from_wordfile import get_docx_file
-file_path = get_docx_file("data")
-core_filename = os.path.splitext(os.path.basename(file_path))[0]
 
-# 関数の呼び出し
-delete_files_and_directories()
\ No newline at end of file
+if __name__ == "__main__":
+    # パスの設定
+    file_path = get_docx_file("data")
+    core_filename = os.path.splitext(os.path.basename(file_path))[0] if file_path else None
+
+    # 関数の呼び出し
+    delete_files_and_directories(core_filename)
@@ -0,0 +1,66 @@
+"""
+このファイルではwordファイル(zip)のメンバーを、圧縮済みのバイト列のまま複製します。
+"""
+
+import struct
+import zipfile
+
+# ローカルファイルヘッダの構造(zipfile.structFileHeader と同じ)
+_LOCAL_HEADER_FORMAT = '<4s2B4HL2L2H'
+_LOCAL_HEADER_SIZE = struct.calcsize(_LOCAL_HEADER_FORMAT)
+
+def can_copy_raw(info):
+    """
+    メンバーを展開せずに複製できるかどうかを判定する
+    """
+    if info.flag_bits & 0x1:  # 暗号化されている
+        return False
+    # ZIP64が必要なサイズのメンバーは通常の書き込みに任せる
+    return info.compress_size < zipfile.ZIP64_LIMIT and info.file_size < zipfile.ZIP64_LIMIT
+
+def read_raw_member(src, info):
+    """
+    元のzipからメンバーの圧縮済みデータをそのまま読み出す
+    """
+    src.fp.seek(info.header_offset)
+    header = struct.unpack(_LOCAL_HEADER_FORMAT, src.fp.read(_LOCAL_HEADER_SIZE))
+    if header[0] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"{info.filename} のローカルヘッダが不正です")
+    # ファイル名と拡張フィールドを読み飛ばす
+    src.fp.seek(header[10] + header[11], 1)
+    return src.fp.read(info.compress_size)
+
+def copy_member_raw(src, dst, info):
+    """
+    元のzipのメンバーを再圧縮せずに出力先のzipへ複製する
+    """
+    if not can_copy_raw(info):
+        dst.writestr(info, src.read(info), compress_type=info.compress_type)
+        return
+
+    raw = read_raw_member(src, info)
+
+    zinfo = zipfile.ZipInfo(info.filename, info.date_time)
+    zinfo.compress_type = info.compress_type
+    zinfo.CRC = info.CRC
+    zinfo.compress_size = info.compress_size
+    zinfo.file_size = info.file_size
+    zinfo.create_system = info.create_system
+    zinfo.external_attr = info.external_attr
+    zinfo.internal_attr = info.internal_attr
+    zinfo.comment = info.comment
+    # サイズは事前に分かっているのでデータディスクリプタは使わない
+    zinfo.flag_bits = info.flag_bits & ~0x08
+
+    # zipfile.ZipFile.writestr と同じ手順で中央ディレクトリへ登録する
+    with dst._lock:
+        dst._writecheck(zinfo)
+        dst._didModify = True
+        if dst._seekable:
+            dst.fp.seek(dst.start_dir)
+        zinfo.header_offset = dst.fp.tell()
+        dst.fp.write(zinfo.FileHeader(False))
+        dst.fp.write(raw)
+        dst.filelist.append(zinfo)
+        dst.NameToInfo[zinfo.filename] = zinfo
+        dst.start_dir = dst.fp.tell()
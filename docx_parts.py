@@ -0,0 +1,124 @@
+"""
+このファイルでは[Content_Types].xmlとリレーションシップから、wordファイル内の校閲対象パーツを特定します。
+"""
+
+import os
+import posixpath
+from lxml import etree as ET
+
+content_types_ns = {'ct': 'http://schemas.openxmlformats.org/package/2006/content-types'}
+relationships_ns = {'rel': 'http://schemas.openxmlformats.org/package/2006/relationships'}
+
+# 本文パーツのコンテンツタイプ(通常の文書・テンプレート・マクロ有効文書)
+MAIN_DOCUMENT_CONTENT_TYPES = {
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml',
+    'application/vnd.ms-word.document.macroEnabled.main+xml',
+    'application/vnd.ms-word.template.macroEnabledTemplate.main+xml',
+}
+
+# 本文から参照される校閲対象パーツのリレーションシップ種別と、そのコンテンツタイプ
+PROOFREAD_PART_TYPES = {
+    'header': 'application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml',
+    'footer': 'application/vnd.openxmlformats-officedocument.wordprocessingml.footer+xml',
+    'footnotes': 'application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml',
+    'endnotes': 'application/vnd.openxmlformats-officedocument.wordprocessingml.endnotes+xml',
+    'comments': 'application/vnd.openxmlformats-officedocument.wordprocessingml.comments+xml',
+}
+
+def _parse_or_none(data):
+    """
+    XMLを解析する(存在しない・壊れている場合はNoneを返す)
+    """
+    if data is None:
+        return None
+    try:
+        return ET.fromstring(data)
+    except ET.XMLSyntaxError:
+        return None
+
+def _content_type_overrides(read_part):
+    """
+    [Content_Types].xmlのOverride要素を、パーツ名(先頭の/なし)とコンテンツタイプの組で返す
+    """
+    root = _parse_or_none(read_part('[Content_Types].xml'))
+    if root is None:
+        return []
+    return [(override.get('PartName', '').lstrip('/'), override.get('ContentType'))
+            for override in root.findall('ct:Override', content_types_ns)]
+
+def _relationships(read_part, rels_name):
+    """
+    .relsファイル内の(種別の末尾, 参照先)の組を順に返す(外部参照は除く)
+    """
+    root = _parse_or_none(read_part(rels_name))
+    if root is None:
+        return []
+    relationships = []
+    for relationship in root.findall('rel:Relationship', relationships_ns):
+        if relationship.get('TargetMode') == 'External':
+            continue
+        relationship_type = relationship.get('Type', '').rsplit('/', 1)[-1]
+        relationships.append((relationship_type, relationship.get('Target', '')))
+    return relationships
+
+def _resolve_target(source_dir, target):
+    """
+    リレーションシップの参照先をパッケージ内のパーツ名に変換する
+    """
+    if target.startswith('/'):
+        return posixpath.normpath(target.lstrip('/'))
+    return posixpath.normpath(posixpath.join(source_dir, target))
+
+def find_proofread_parts(read_part, has_part):
+    """
+    校閲対象のパーツ名を、本文・ヘッダー・フッター・脚注・文末脚注・コメントの順に返す
+    read_partはパーツ名を受け取り、その内容(存在しない場合はNone)を返す関数
+    has_partはパーツ名を受け取り、そのパーツが存在するかを返す関数
+    """
+    overrides = _content_type_overrides(read_part)
+
+    # 本文パーツは[Content_Types].xmlから特定し、無ければパッケージのリレーションシップを参照する
+    main_part = next((name for name, content_type in overrides if content_type in MAIN_DOCUMENT_CONTENT_TYPES), None)
+    if main_part is None:
+        main_part = next((_resolve_target('', target) for relationship_type, target in _relationships(read_part, '_rels/.rels')
+                          if relationship_type == 'officeDocument'), 'word/document.xml')
+    if not has_part(main_part):
+        return []
+
+    parts = [main_part]
+    main_dir, main_name = posixpath.split(main_part)
+    relationships = _relationships(read_part, posixpath.join(main_dir, '_rels', main_name + '.rels'))
+    if relationships:
+        for relationship_type, target in relationships:
+            part_name = _resolve_target(main_dir, target)
+            if relationship_type in PROOFREAD_PART_TYPES and part_name not in parts and has_part(part_name):
+                parts.append(part_name)
+    else:
+        # リレーションシップが無い場合は[Content_Types].xmlの登録内容のみで判断する
+        proofread_content_types = set(PROOFREAD_PART_TYPES.values())
+        for name, content_type in overrides:
+            if content_type in proofread_content_types and name not in parts and has_part(name):
+                parts.append(name)
+    return parts
+
+def find_proofread_parts_in_zip(docx):
+    """
+    開いているwordファイル(zipfile.ZipFile)から校閲対象のパーツ名を返す
+    """
+    names = set(docx.namelist())
+    return find_proofread_parts(lambda name: docx.read(name) if name in names else None, names.__contains__)
+
+def find_proofread_parts_in_dir(xml_dir):
+    """
+    展開済みのディレクトリから校閲対象のパーツ名を返す
+    """
+    def has_part(name):
+        return os.path.isfile(os.path.join(xml_dir, *name.split('/')))
+
+    def read_part(name):
+        if not has_part(name):
+            return None
+        with open(os.path.join(xml_dir, *name.split('/')), 'rb') as f:
+            return f.read()
+    return find_proofread_parts(read_part, has_part)
@@ -0,0 +1,130 @@
+"""
+このファイルではwordファイルを書き換えずに、全角・半角のルールに違反している箇所を検出します。
+展開・ハイライト・再圧縮を行わず、校閲対象のパーツをzipファイルから直接読み込みながら判定します。
+違反が見つかった場合は終了コード1で終了するため、CI等での確認に使用できます。
+
+    python lint_docx.py data/原稿.docx --max 10
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import zipfile
+import zlib
+from lxml import etree as ET
+from docx_parts import find_proofread_parts_in_zip
+from make_xml_from_wordfile import get_docx_files
+from process import build_paragraph_index, conversion_rules, namespaces
+from rule_engine import compile_rules
+
+PARAGRAPH_TAG = f"{{{namespaces['w']}}}p"
+
+# 段落内の全てのテキスト(<w:t>要素の内容)を文書順に取得するXPath
+PARAGRAPH_TEXTS = ET.XPath('.//w:t/text()', namespaces=namespaces, smart_strings=False)
+
+def iter_paragraph_texts(source):
+    """
+    パーツのXMLを先頭から読み込みながら、(段落番号, 段落内のテキストを連結した文字列)を返す
+    段落番号はprocess_rootと同じく文書順(開始タグの順)で、入れ子の段落は外側の段落より先に返す
+    判定を終えた段落は解放するため、メモリ使用量は文書サイズに依存しない
+    """
+    paragraph_index = 0
+    open_paragraphs = []  # 読み込み中の段落の[段落番号, 入れ子の段落を含むかどうか]
+    for event, elem in ET.iterparse(source, events=('start', 'end'), tag=PARAGRAPH_TAG):
+        if event == 'start':
+            open_paragraphs.append([paragraph_index, False])
+            paragraph_index += 1
+            continue
+        index, has_nested = open_paragraphs.pop()
+        if has_nested:
+            # テキストボックス等の入れ子の段落のテキストは含めない
+            yield index, ''.join(t_element.text for _, _, _, t_element in build_paragraph_index(elem))
+        else:
+            yield index, ''.join(PARAGRAPH_TEXTS(elem))
+        if open_paragraphs:
+            open_paragraphs[-1][1] = True
+        else:
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+def lint_part(source, part_name, engine):
+    """
+    1つのパーツの違反箇所を返す
+    段落内のテキストを連結して判定するため、位置(offset)は段落のテキスト内での位置になる
+    重なり合う範囲に複数のルールが適用される場合は1件にまとめ、修正案は全ルールを適用した後の文字列とする
+    """
+    for paragraph_index, text in iter_paragraph_texts(source):
+        if not text:
+            continue
+        for start, end, after, indices in engine.find_changes(text):
+            yield {'part': part_name, 'paragraph': paragraph_index, 'offset': start,
+                   'rule': '、'.join(dict.fromkeys(engine.rules[index]['name'] for index in indices)),
+                   'text': text[start:end], 'suggestion': after}
+
+def lint_docx(docx_file, rules=conversion_rules):
+    """
+    wordファイルの校閲対象パーツ(本文・ヘッダー・フッター・脚注等)の違反箇所を順に返す
+    必要な数の違反が見つかった時点で読み込みを打ち切れるよう、ジェネレーターとして返す
+    wordファイルやXMLが壊れている場合は例外(zipfile.BadZipFile・lxml.etree.XMLSyntaxError・zlib.error等)を送出する
+    """
+    engine = compile_rules(rules)
+    with zipfile.ZipFile(docx_file, 'r') as src:
+        for part_name in find_proofread_parts_in_zip(src):
+            with src.open(part_name) as part:
+                yield from lint_part(part, part_name, engine)
+
+def format_violation(docx_file, violation):
+    """
+    違反箇所を1行のテキストにする
+    """
+    return (f"{docx_file}:{violation['part']}:段落 {violation['paragraph']}:{violation['offset']}: "
+            f"{violation['rule']} '{violation['text']}' → '{violation['suggestion']}'")
+
+def parse_args():
+    """
+    コマンドライン引数を解析する
+    """
+    parser = argparse.ArgumentParser(description="wordファイルを書き換えずに、全角・半角のルールに違反している箇所を表示します。")
+    parser.add_argument('docx_files', nargs='*', metavar='DOCX',
+                        help="検査する.docxファイル(省略時はdataディレクトリ内の全ての.docxファイル)")
+    parser.add_argument('--max', type=int, metavar='N', help="違反をN件見つけた時点で検査を終了する")
+    parser.add_argument('--format', choices=['text', 'jsonl'], default='text',
+                        help="出力形式(jsonl: 文書・パーツ・段落・位置・ルール・修正案を1行1件のJSONで出力)")
+    return parser.parse_args()
+
+def main():
+    """
+    違反がない場合は0、違反がある場合は1、検査できないファイルがある場合は2を返す
+    """
+    args = parse_args()
+    docx_files = args.docx_files or get_docx_files("data")
+    found = 0
+    failed = False
+    for docx_file in docx_files:
+        remaining = None if args.max is None else args.max - found
+        if remaining is not None and remaining <= 0:
+            break
+        try:
+            for violation in itertools.islice(lint_docx(docx_file), remaining):
+                found += 1
+                if args.format == 'jsonl':
+                    print(json.dumps({'document': docx_file, **violation}, ensure_ascii=False))
+                else:
+                    print(format_violation(docx_file, violation))
+        except (zipfile.BadZipFile, ET.XMLSyntaxError, OSError, zlib.error, EOFError, RuntimeError, NotImplementedError,
+                KeyError) as e:
+            # 圧縮データの破損(zlib.error・EOFError)・暗号化(RuntimeError)・未対応の圧縮形式(NotImplementedError)・
+            # 存在しないパーツの参照(KeyError)も、違反ではなく検査できないファイルとして扱う
+            print(f"{docx_file} を検査できませんでした: {e}", file=sys.stderr)
+            failed = True
+    if args.format == 'text':
+        print(f"違反: {found} 件" + (f"(最大 {args.max} 件まで表示)" if args.max is not None and found >= args.max else ""))
+    if failed:
+        return 2
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
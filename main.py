@@ -1,24 +1,159 @@
 # docx_processing.py から関数をインポート
-from make_xml_from_wordfile import get_docx_file, extract_docx_to_xml
-from process import process_all_files
+from make_xml_from_wordfile import get_docx_file, get_docx_files, extract_docx_to_xml
+from batch_process import proofread_batch
+from process import process_all_files, conversion_rules
+from proofread_in_memory import proofread_docx_in_memory
+from rule_engine import compile_rules, conversion_cache
+from part_cache import PartCache
+from paragraph_cache import ParagraphCache
+from profiler import profiler
 from remake_wordfile_from_xml import create_docx
+import argparse
 import os
+import shutil
 
 
-# .docx ファイルのパス取得
-docx_file = get_docx_file("data")  # ディレクトリを指定
+def parse_args():
+    """
+    コマンドライン引数を解析する
+    """
+    parser = argparse.ArgumentParser(description="全角・半角の校閲を行います。")
+    parser.add_argument('--in-memory', action='store_true',
+                        help="xml/・xml_new/ に展開せず、メモリ上で校閲して出力する")
+    parser.add_argument('--stream', action='store_true',
+                        help="XML全体を読み込まず、段落単位で変換・書き出しを行う(巨大な文書向け)")
+    parser.add_argument('--batch', action='store_true',
+                        help="dataディレクトリ内(サブディレクトリを含む)の全ての.docxファイルを校閲する")
+    parser.add_argument('--include', action='append', metavar='GLOB',
+                        help="--batch時に対象とするファイルのglobパターン(複数指定可)")
+    parser.add_argument('--exclude', action='append', metavar='GLOB',
+                        help="--batch時に除外するファイルのglobパターン(複数指定可)")
+    parser.add_argument('--output-dir', default='.',
+                        help="--batch時の出力先ディレクトリ")
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                        help="dataディレクトリ内の全ファイルをN個のプロセスで並列に校閲する(--batchを含む)")
+    parser.add_argument('--part-jobs', type=int, default=1, metavar='N',
+                        help="1つの文書の本文・ヘッダー・フッター等のパーツをN個のプロセスで並列に校閲する")
+    parser.add_argument('--text-cache-size', type=int, default=conversion_cache.maxsize, metavar='N',
+                        help="同じテキストの変換結果を最大N件までキャッシュする(0で無効)")
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help="校閲済みパーツをDIRにキャッシュし、内容が変わっていないパーツの再校閲を省略する")
+    parser.add_argument('--incremental', action='store_true',
+                        help="前回の実行結果(--cache-dirに保存)から変わった段落のみを校閲する")
+    parser.add_argument('--coalesce-runs', action='store_true',
+                        help="校閲の前に、書式が同じで隣り合うラン(編集履歴の識別子のみが異なるもの)を1つにまとめる")
+    parser.add_argument('--log-format', choices=['text', 'jsonl'], default='text',
+                        help="変更記録のログ形式(jsonl: 文書・パーツ・段落・ラン・変更範囲・ルールを1行1件のJSONで出力)")
+    parser.add_argument('--profile', nargs='?', const='profile_report.json', metavar='FILE',
+                        help="段階ごとの処理時間・CPU時間・メモリ使用量・読み書きしたバイト数をFILE(JSON)に出力する")
+    parser.add_argument('--profile-table', action='store_true',
+                        help="--profileの結果を段階ごとに集計した表を表示する")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="--profile時にtracemallocでメモリ使用量の最大値も記録する(処理は遅くなる)")
+    args = parser.parse_args()
+    if (args.profile_table or args.profile_memory) and not args.profile:
+        args.profile = 'profile_report.json'
+    if args.incremental and not args.cache_dir:
+        parser.error("--incremental には --cache-dir の指定が必要です")
+    return args
 
-# XMLへ変換
-extract_docx_to_xml(docx_file, "xml/")
-extract_docx_to_xml(docx_file, "xml_new/")  # 別ディレクトリへの変換
 
-# document.xml の存在確認と待機
-document_xml_path = 'xml_new/word/document.xml'
+def print_cache_stats(part_cache, paragraph_cache):
+    """
+    キャッシュの利用状況を表示し、段落キャッシュを次回の実行用に保存する
+    """
+    if part_cache is not None:
+        part_cache.print_stats()
+    if paragraph_cache is not None:
+        paragraph_cache.save()
+        paragraph_cache.print_stats()
 
-# 校閲処理を実行
-process_all_files('conversion_rules_log.txt')
 
-# 校閲後のXMLファイルをWordファイルに再構成
-core_filename = os.path.splitext(os.path.basename(docx_file))[0]
-output_docx = f"【校閲ずみ】{core_filename}.docx"
-create_docx("xml_new", output_docx)
\ No newline at end of file
+def main():
+    args = parse_args()
+    if not args.profile:
+        run(args)
+        return
+
+    profiler.start(trace_memory=args.profile_memory)
+    try:
+        with profiler.stage('total'):
+            run(args)
+    finally:
+        profiler.stop()
+        profiler.write_json(args.profile)
+        if args.profile_table:
+            print('\n'.join(profiler.format_table()))
+        print(f"計測結果を {args.profile} に出力しました。")
+
+
+def run(args):
+    """
+    コマンドライン引数に従って校閲を行う
+    """
+    conversion_cache.resize(args.text_cache_size)
+    part_cache = PartCache(args.cache_dir) if args.cache_dir else None
+
+    # dataディレクトリ内の全ファイルをまとめて校閲する場合
+    if args.batch or args.jobs > 1:
+        with profiler.stage('glob_scan'):
+            docx_files = get_docx_files("data", include=args.include, exclude=args.exclude)
+        proofread_batch(docx_files, "data", args.output_dir, 'conversion_rules_log.txt',
+                        stream=args.stream, jobs=args.jobs, part_cache=part_cache, incremental=args.incremental,
+                        log_format=args.log_format, coalesce=args.coalesce_runs)
+        return
+
+    # .docx ファイルのパス取得
+    with profiler.stage('glob_scan'):
+        docx_file = get_docx_file("data")  # ディレクトリを指定
+    if docx_file is None:
+        return
+
+    core_filename = os.path.splitext(os.path.basename(docx_file))[0]
+    output_docx = f"【校閲ずみ】{core_filename}.docx"
+
+    # 前回の実行から変わった段落のみを校閲する場合
+    paragraph_cache = None
+    if args.incremental:
+        fingerprint = compile_rules(conversion_rules).fingerprint
+        paragraph_cache = ParagraphCache.for_document(args.cache_dir, docx_file, fingerprint, "data")
+
+    # メモリ上で校閲を完結させる場合
+    if args.in_memory:
+        proofread_docx_in_memory(docx_file, output_docx, 'conversion_rules_log.txt',
+                                 stream=args.stream, part_jobs=args.part_jobs, part_cache=part_cache,
+                                 paragraph_cache=paragraph_cache, log_format=args.log_format,
+                                 coalesce=args.coalesce_runs)
+        print_cache_stats(part_cache, paragraph_cache)
+        return
+
+    # XMLへ変換
+    docx_size = os.path.getsize(docx_file)
+    with profiler.stage('extract_docx_to_xml', document=docx_file, bytes_read=docx_size):
+        extract_docx_to_xml(docx_file, "xml/")
+    with profiler.stage('extract_docx_to_xml', document=docx_file, bytes_read=docx_size):
+        extract_docx_to_xml(docx_file, "xml_new/")  # 別ディレクトリへの変換
+
+    # 校閲処理を実行
+    with profiler.stage('process_all_files', document=docx_file, engine=compile_rules(conversion_rules)):
+        processed_files = process_all_files('conversion_rules_log.txt', stream=args.stream, jobs=args.part_jobs,
+                                            part_cache=part_cache, paragraph_cache=paragraph_cache,
+                                            log_format=args.log_format, document=docx_file,
+                                            coalesce=args.coalesce_runs)
+    modified_parts = [os.path.relpath(path, "xml_new").replace(os.sep, '/') for path in processed_files]
+
+    # 校閲後のXMLファイルをWordファイルに再構成(未変更のパーツは元のファイルから複製)
+    with profiler.stage('create_docx', document=docx_file) as stage:
+        if modified_parts:
+            create_docx("xml_new", output_docx, source_docx=docx_file, modified_parts=modified_parts)
+        else:
+            # どのパーツも変更しなかった場合は元のファイルをそのまま複製する
+            shutil.copyfile(docx_file, output_docx)
+            print(f"変更箇所がないため、{docx_file} を {output_docx} にそのまま複製しました。")
+        stage.bytes_written = os.path.getsize(output_docx)
+
+    print_cache_stats(part_cache, paragraph_cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@
 """
 import zipfile
 import os
+import fnmatch
 
 def get_docx_file(data_dir):
     """
@@ -16,6 +17,36 @@ def get_docx_file(data_dir):
     
     return os.path.join(data_dir, docx_files[0])
 
+def get_docx_files(data_dir, include=None, exclude=None, recursive=True):
+    """
+    指定ディレクトリ内の全てのwordファイルを取得する
+    include・excludeにはdata_dirからの相対パスに対するglobパターンを指定する
+    """
+    if not os.path.isdir(data_dir):
+        print(f"ディレクトリ '{data_dir}' は存在しません。")
+        return []
+
+    docx_files = []
+    for foldername, subfolders, filenames in os.walk(data_dir):
+        subfolders.sort()
+        if not recursive:
+            subfolders.clear()
+        for filename in sorted(filenames):
+            # Wordが作成する一時ファイル(~$で始まる)と、出力先をdataディレクトリ内にした場合の校閲済みファイルは対象外
+            if not filename.endswith('.docx') or filename.startswith(('~$', '【校閲ずみ】')):
+                continue
+            file_path = os.path.join(foldername, filename)
+            relative_path = os.path.relpath(file_path, data_dir).replace(os.sep, '/')
+            if include and not any(fnmatch.fnmatch(relative_path, pattern) for pattern in include):
+                continue
+            if exclude and any(fnmatch.fnmatch(relative_path, pattern) for pattern in exclude):
+                continue
+            docx_files.append(file_path)
+
+    if not docx_files:
+        print("dataディレクトリにファイルが見つかりませんでした")
+    return docx_files
+
 def extract_docx_to_xml(docx_file, output_dir):
     """
     wordファイルをxmlファイルに変換する
@@ -0,0 +1,125 @@
+"""
+このファイルでは段落ごとの校閲結果を保存し、前回の実行から変わっていない段落の再校閲を省略します。
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+from part_cache import CACHE_FORMAT
+
+class ParagraphCache:
+    """
+    段落のフィンガープリント(テキストとランの構成を含むXML)ごとに、
+    前回の実行で行った変更内容と変更記録を保持するキャッシュ
+    パーツキャッシュのキーごとに、そのパーツに含まれる段落のフィンガープリントも保持する
+    """
+
+    def __init__(self, path, fingerprint):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.previous, self.previous_parts = self._load()
+        self.current = {}
+        self.current_parts = {}
+        self._part_keys = None  # 校閲中のパーツの段落のフィンガープリント
+        self.used = False       # 今回の実行でキャッシュを参照・記録したかどうか
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_document(cls, cache_dir, docx_file, fingerprint, data_dir='data'):
+        """
+        文書ごとのキャッシュを開く
+        文書はdata_dirからの相対パスで区別する(別のサブディレクトリにある同名の文書は別の文書として扱う)
+        """
+        relative_path = os.path.relpath(docx_file, data_dir).replace(os.sep, '/')
+        name_hash = hashlib.sha256(relative_path.encode('utf-8')).hexdigest()
+        return cls(os.path.join(cache_dir, 'paragraphs', name_hash + '.json'), fingerprint)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}, {}
+        # ルールや記録の形式が変わっている場合は前回の結果を使用しない
+        if data.get('rules') != self.fingerprint or data.get('format') != CACHE_FORMAT:
+            return {}, {}
+        return data.get('paragraphs', {}), data.get('parts', {})
+
+    def make_key(self, paragraph_xml):
+        """
+        段落のXML(バイト列)からフィンガープリントを求める
+        """
+        return hashlib.sha256(paragraph_xml).hexdigest()
+
+    def get(self, key):
+        """
+        前回(または今回)の実行で記録した(変更内容, 変更記録)を返す(無い場合はNone)
+        """
+        self.used = True
+        if self._part_keys is not None:
+            self._part_keys[key] = True
+        entry = self.current.get(key) or self.previous.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.current[key] = entry
+        self.hits += 1
+        return entry['changes'], entry['records']
+
+    def put(self, key, changes, records):
+        self.used = True
+        if self._part_keys is not None:
+            self._part_keys[key] = True
+        self.current[key] = {'changes': changes, 'records': records}
+
+    @contextlib.contextmanager
+    def part(self, part_key):
+        """
+        パーツの校閲中に参照・記録した段落を、パーツキャッシュのキー(part_key)に対応付けて記録する
+        """
+        self._part_keys = self.current_parts.setdefault(part_key, {})
+        try:
+            yield
+        finally:
+            self._part_keys = None
+
+    def keep_part(self, part_key):
+        """
+        パーツキャッシュで校閲を省略したパーツの段落の結果を、前回の結果から今回の結果に引き継ぐ
+        """
+        self.used = True
+        keys = self.previous_parts.get(part_key)
+        if keys is None:
+            return
+        self.current_parts[part_key] = dict.fromkeys(keys, True)
+        for key in keys:
+            entry = self.previous.get(key)
+            if entry is not None:
+                self.current.setdefault(key, entry)
+
+    def save(self):
+        """
+        今回の実行で参照・記録した段落の結果のみを保存する(次回の実行で前回の結果として使用する)
+        文書から削除された段落や編集前の段落の結果は保存せず、キャッシュが際限なく大きくならないようにする
+        パーツキャッシュで校閲を省略したパーツの段落は、keep_partで引き継いだ結果を保存する
+        キャッシュを一度も参照しなかった場合(パーツを並列に変換した場合等)は、前回の結果を残すため保存しない
+        """
+        if not self.used:
+            return
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'format': CACHE_FORMAT, 'rules': self.fingerprint, 'paragraphs': self.current,
+                       'parts': {part_key: list(keys) for part_key, keys in self.current_parts.items()}},
+                      f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def print_stats(self):
+        """
+        段落キャッシュのヒット数を表示する
+        """
+        print(f"段落キャッシュ: 再利用 {self.hits} / 再校閲 {self.misses} 段落")
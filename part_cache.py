@@ -0,0 +1,80 @@
+"""
+このファイルでは校閲済みパーツをディスクにキャッシュし、内容が変わっていないパーツの再校閲を省略します。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+# キャッシュに保存する変更記録の形式(形式を変えた場合は値を上げ、古いエントリを使用しないようにする)
+CACHE_FORMAT = 5
+
+class PartCache:
+    """
+    パーツ内容のSHA-256・ルールのフィンガープリント・処理オプションをキーに、
+    校閲後のバイト列と変更記録・統計を保存するディスクキャッシュ
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def print_stats(self):
+        """
+        キャッシュのヒット数を表示する
+        """
+        print(f"パーツキャッシュ: ヒット {self.hits} / ミス {self.misses}")
+
+    def make_key(self, data, fingerprint, **options):
+        """
+        キャッシュのキーを求める
+        """
+        content_hash = hashlib.sha256(data).hexdigest()
+        option_text = ','.join(f'{name}={value}' for name, value in sorted(options.items()))
+        return hashlib.sha256(f'{CACHE_FORMAT}|{content_hash}|{fingerprint}|{option_text}'.encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        directory = os.path.join(self.cache_dir, key[:2])
+        return directory, os.path.join(directory, key + '.xml'), os.path.join(directory, key + '.json')
+
+    def load(self, key):
+        """
+        キャッシュされた(校閲後のバイト列, 変更記録, 統計)を返す(無い場合はNone)
+        校閲で変更しなかったパーツのバイト列は空になる
+        """
+        directory, data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(data_path, 'rb') as f:
+                data = f.read()
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data, meta['records'], meta['stats']
+
+    def store(self, key, data, records, stats):
+        """
+        校閲結果を保存する(並行して書き込まれても壊れないよう一時ファイルから置き換える)
+        """
+        directory, data_path, meta_path = self._paths(key)
+        os.makedirs(directory, exist_ok=True)
+        self._write_atomic(directory, data_path, data)
+        meta = json.dumps({'records': records, 'stats': stats}, ensure_ascii=False).encode('utf-8')
+        # メタデータを後に書き込むことで、データが揃っているエントリのみ読み込まれるようにする
+        self._write_atomic(directory, meta_path, meta)
+
+    @staticmethod
+    def _write_atomic(directory, path, data):
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
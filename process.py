@@ -4,7 +4,17 @@
 
 import regex as re  # regexモジュールを使用
 from lxml import etree as ET
-import glob  # globモジュールのインポート
+from rule_engine import compile_rules
+from coalesce_runs import coalesce_runs
+from change_log import (ChangeLogWriter, ChangeRecordBuffer, make_change_record, make_rule_counts_record, replay_changes,
+                        set_log_context, write_change)
+from docx_parts import find_proofread_parts_in_dir
+from profiler import profiler
+import contextlib
+import io
+import multiprocessing
+import os
+import pickle
 
 namespaces = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
 ET.register_namespace('w', namespaces['w'])
@@ -75,7 +85,8 @@ conversion_rules = [
 
 def apply_conversion_rule(text, rule):
     """
-   括弧内に日本語がある場合に使用する関数
+    1つのルールをテキストに適用する関数
+    校閲ではcompile_rulesでまとめて適用するため、テストでルールを順に適用した結果(期待値)を求めるのに使用する
     """
     if rule['check_japanese']:
         # 日本語が含まれるか確認してから変換
@@ -85,23 +96,94 @@ def apply_conversion_rule(text, rule):
         return re.sub(rule['pattern'], rule['replace'], text)
     return text
 
-def process_runs_in_paragraph(paragraph, log_file, rules):
+def build_paragraph_index(paragraph):
+    """
+    段落内のテキスト(<w:t>要素)を文書順に並べ、(ラン番号, テキスト番号, <w:r>要素, <w:t>要素)のリストを返す関数
+    テキストボックス等の入れ子の段落に属するテキストは、その段落を処理する際に扱うため含めない
+    """
+    paragraph_tag = f"{{{namespaces['w']}}}p"
+    index = []
+    for run_index, run in enumerate(paragraph.iter(f"{{{namespaces['w']}}}r")):
+        # ハイパーリンク・変更履歴内のランは段落の孫要素のため、祖先をたどって所属する段落を確認する
+        run_paragraph = paragraph if run.getparent() is paragraph else next(run.iterancestors(paragraph_tag))
+        for t_index, t_element in enumerate(run.iter(f"{{{namespaces['w']}}}t")):
+            if not t_element.text:
+                continue
+            if run_paragraph is not paragraph or (t_element.getparent() is not run and
+                                                  next(t_element.iterancestors(paragraph_tag)) is not paragraph):
+                continue
+            index.append((run_index, t_index, run, t_element))
+    return index
+
+def process_runs_in_paragraph(paragraph, log_file, rules, changes=None, paragraph_index=None):
     """
     <w:r>要素内のテキストに対して正規表現のルールを適用する関数
+    段落内のテキストを連結して1回でルールを適用するため、複数のランに分割された文字列も1つの文字列として判定する
+    変更したテキストごとに、段落・ラン・テキストの番号と変更範囲、ルールごとの変更箇所を変更記録としてログに書き込む
+    changesにリストを渡した場合、変更内容を(ラン番号, テキスト番号, 変更後テキスト)で記録する
+    テキストを変更した場合はTrueを返す
+    """
+    engine = compile_rules(rules)
+    index = build_paragraph_index(paragraph)
+    if not index:
+        return False
+    converted = engine.convert_segments([t_element.text for _, _, _, t_element in index])
+    modified = False
+    for (run_index, t_index, run, t_element), (new_text, matches) in zip(index, converted):
+        original_text = t_element.text
+        if new_text != original_text:
+            modified = True
+            t_element.text = new_text
+            write_change(log_file, make_change_record(paragraph_index, run_index, t_index, original_text,
+                                                      new_text, engine.describe_matches(matches)))
+            apply_color_to_run(run, 'green')
+            if changes is not None:
+                changes.append((run_index, t_index, new_text))
+    return modified
+
+def apply_paragraph_changes(paragraph, changes):
+    """
+    process_runs_in_paragraphで記録した変更内容を段落に再適用する関数
     """
     runs = paragraph.findall('.//w:r', namespaces)
-    for run in runs:
-        t_elements = run.findall('.//w:t', namespaces)
-        for t_element in t_elements:
-            original_text = t_element.text
-            new_text = original_text
-            if original_text:
-                for rule in rules:
-                    new_text = apply_conversion_rule(new_text, rule)
-                if new_text != original_text:
-                    t_element.text = new_text
-                    log_file.write(f"対象テキスト: '{original_text}', 適用ルール: '全ルール', 適用後テキスト: '{new_text}'\n")
-                    apply_color_to_run(run, 'green')
+    for run_index, t_index, new_text in changes:
+        run = runs[run_index]
+        run.findall('.//w:t', namespaces)[t_index].text = new_text
+        apply_color_to_run(run, 'green')
+
+def process_paragraph(paragraph, log_file, rules, paragraph_cache=None, paragraph_index=None, coalesce=False):
+    """
+    1つの段落を変換する関数
+    paragraph_cacheを指定した場合、前回の実行から変わっていない段落は記録済みの変更内容を再適用する
+    coalesce=Trueの場合は変換の前に、書式が同じで隣り合うランを1つにまとめる
+    段落を変更した(テキストの変換またはランの統合を行った)場合はTrueを返す
+    """
+    coalesced = False
+    if coalesce:
+        stats = coalesce_runs(paragraph)
+        compile_rules(rules).add_stats(stats)
+        coalesced = stats['runs_removed'] > 0
+    if paragraph_cache is None:
+        return process_runs_in_paragraph(paragraph, log_file, rules, paragraph_index=paragraph_index) or coalesced
+
+    key = paragraph_cache.make_key(ET.tostring(paragraph, encoding='utf-8', with_tail=False))
+    cached = paragraph_cache.get(key)
+    if cached is not None:
+        changes, records = cached
+        apply_paragraph_changes(paragraph, changes)
+        # 境界をまたぐ変更の継続部分は、開始位置を含むテキストの変更箇所として数え済み
+        compile_rules(rules).count_rules(match['rule'] for record in records for match in record['matches']
+                                         if not match.get('continued'))
+        # 段落の位置は前回から変わっている場合があるため、今回の段落番号で記録する
+        replay_changes(log_file, records, paragraph=paragraph_index)
+        return bool(changes) or coalesced
+
+    changes = []
+    paragraph_log = ChangeRecordBuffer()
+    process_runs_in_paragraph(paragraph, paragraph_log, rules, changes, paragraph_index)
+    paragraph_cache.put(key, changes, paragraph_log.records)
+    replay_changes(log_file, paragraph_log.records)
+    return bool(changes) or coalesced
 
 def apply_color_to_run(run, color):
     """
@@ -113,45 +195,441 @@ def apply_color_to_run(run, color):
     highlight_elem = ET.SubElement(rpr, '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}highlight')
     highlight_elem.set('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}val', color)
 
-def process_footer_file(file_path, log_file, rules):
+def process_root(root, log_file, rules, paragraph_cache=None, coalesce=False):
     """
-    footer.xmlに対して変換を行う関数
+    XMLのルート要素配下の各段落に対して変換を行う関数
+    いずれかの段落を変更した場合はTrueを返す
     """
-    tree = ET.parse(file_path)
-    root = tree.getroot()
-    
-    # フッター内の各段落を処理
-    for paragraph in root.findall('.//w:p', namespaces):
-        process_runs_in_paragraph(paragraph, log_file, rules)
+    modified = False
+    for paragraph_index, paragraph in enumerate(root.findall('.//w:p', namespaces)):
+        modified = process_paragraph(paragraph, log_file, rules, paragraph_cache, paragraph_index, coalesce) or modified
+    return modified
+
+def xml_prolog(data):
+    """
+    XMLのバイト列の先頭にあるXML宣言(standalone等の指定を含む)と、その直後の改行を返す関数
+    """
+    match = re.match(rb'<\?xml[^>]*\?>\s*', data)
+    return match.group() if match else b''
+
+def read_xml_prolog(source):
+    """
+    XMLファイル(パスまたはファイルオブジェクト)の先頭からXML宣言を読み取る関数
+    ファイルオブジェクトの場合は読み取り後に元の位置へ戻す
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return xml_prolog(f.read(1024))
+    position = source.tell()
+    head = source.read(1024)
+    source.seek(position)
+    return xml_prolog(head)
+
+def serialize_tree(tree, prolog):
+    """
+    XMLを整形せずにバイト列へ書き出す関数
+    XML宣言は元のファイルのもの(prolog)をそのまま使用するため、変更していない部分は元のバイト列と一致する
+    (名前空間の接頭辞・属性の順序・空白はlxmlが解析時のまま保持する)
+    """
+    if not prolog or tree.docinfo.encoding.upper() != 'UTF-8':
+        # 宣言がない・UTF-8以外の場合は、UTF-8の宣言を付けて書き出す
+        return ET.tostring(tree, encoding='UTF-8', xml_declaration=True, standalone=tree.docinfo.standalone)
+    return prolog + ET.tostring(tree, encoding='UTF-8', xml_declaration=False)
+
+def _strip_inherited_namespaces(data, nsmap):
+    """
+    単独でシリアライズした要素の開始タグから、親要素で宣言済みの名前空間宣言を取り除く関数
+    """
+    tag_end = data.index(b'>')
+    def strip(match):
+        prefix = match.group(1).decode('utf-8') if match.group(1) else None
+        return b'' if nsmap.get(prefix) == match.group(2).decode('utf-8') else match.group()
+    return re.sub(rb' xmlns(?::([^=\s]+))?="([^"]*)"', strip, data[:tag_end]) + data[tag_end:]
+
+def _split_element_tags(elem, nsmap):
+    """
+    要素の開始タグと終了タグをそれぞれバイト列で返す関数
+    """
+    shell = ET.Element(elem.tag, attrib=dict(elem.attrib), nsmap=elem.nsmap)
+    shell.text = 'STREAM_PLACEHOLDER'
+    data = _strip_inherited_namespaces(ET.tostring(shell, encoding='utf-8'), nsmap)
+    start_tag, end_tag = data.split(b'STREAM_PLACEHOLDER', 1)
+    return start_tag, end_tag
+
+def process_xml_stream(source, output, log_file, rules, paragraph_cache=None, coalesce=False):
+    """
+    iterparseで要素を読み込みながら段落を変換し、完成した要素から順に書き出す関数
+    ルート要素とw:bodyの直下の要素を1つずつ処理・解放するため、メモリ使用量は文書サイズに依存しない
+    XML宣言は元のものを書き出し、要素は整形せずに書き出す(要素間の空白は保持しない)
+    いずれかの段落を変更した場合はTrueを返す
+    """
+    if isinstance(output, str):
+        with open(output, 'wb') as output_file:
+            return process_xml_stream(source, output_file, log_file, rules, paragraph_cache, coalesce)
+
+    body_tag = f"{{{namespaces['w']}}}body"
+    paragraph_tag = f"{{{namespaces['w']}}}p"
+
+    output.write(read_xml_prolog(source) or b"<?xml version='1.0' encoding='UTF-8'?>\n")
+    open_elements = []  # 開始タグのみを書き出した要素(ルート・w:body)と、その終了タグ
+    depth = 0
+    paragraph_index = 0  # process_rootと同じく、文書順の段落番号
+    modified = False
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if depth == 0 or (depth == 1 and elem.tag == body_tag):
+                parent_nsmap = open_elements[-1][0].nsmap if open_elements else {}
+                start_tag, end_tag = _split_element_tags(elem, parent_nsmap)
+                output.write(start_tag)
+                open_elements.append((elem, end_tag))
+            depth += 1
+            continue
+
+        depth -= 1
+        if open_elements and open_elements[-1][0] is elem:
+            # 子要素を書き出し終えたので終了タグを書き出す
+            output.write(open_elements.pop()[1])
+            continue
+
+        parent = elem.getparent()
+        if open_elements and open_elements[-1][0] is parent:
+            for paragraph in elem.iter(paragraph_tag):
+                modified = process_paragraph(paragraph, log_file, rules, paragraph_cache, paragraph_index,
+                                             coalesce) or modified
+                paragraph_index += 1
+            data = ET.tostring(elem, encoding='utf-8', with_tail=False)
+            output.write(_strip_inherited_namespaces(data, parent.nsmap))
+            # 書き出した要素を解放する
+            elem.clear()
+            parent.remove(elem)
+    return modified
+
+def process_xml_bytes(xml_bytes, log_file, rules, stream=False, paragraph_cache=None, coalesce=False):
+    """
+    メモリ上のXML(バイト列)に対して変換を行い、変換後のバイト列を返す関数
+    coalesce=Trueの場合は各段落の変換の前に、書式が同じで隣り合うランを1つにまとめる
+    どの段落も変更しなかった場合は、書き出さずに元のバイト列をそのまま返す
+    """
+    engine = compile_rules(rules)
+    if stream:
+        output = io.BytesIO()
+        with profiler.stage('stream', engine=engine, bytes_read=len(xml_bytes)) as stage:
+            modified = process_xml_stream(io.BytesIO(xml_bytes), output, log_file, rules, paragraph_cache, coalesce)
+            stage.bytes_written = output.tell()
+        return output.getvalue() if modified else xml_bytes
+
+    with profiler.stage('parse', bytes_read=len(xml_bytes)):
+        root = ET.fromstring(xml_bytes)
+    tree = root.getroottree()
+    with profiler.stage('process', engine=engine):
+        modified = process_root(root, log_file, rules, paragraph_cache, coalesce)
+    if not modified:
+        return xml_bytes
+    with profiler.stage('serialize') as stage:
+        data = serialize_tree(tree, xml_prolog(xml_bytes))
+        stage.bytes_written = len(data)
+    return data
+
+def worker_context(rules):
+    """
+    ルールをワーカープロセスに渡せる場合は、プラットフォームの既定のmultiprocessingのコンテキストを返す関数
+    conversion_rulesはワーカーがモジュールから読み込み、それ以外のルールはプールの初期化時にpickleして渡す
+    pickleできないルール(lambdaを含むもの等)の場合はNone(並列処理を行わない)を返す
+    """
+    if rules is not conversion_rules:
+        try:
+            pickle.dumps(rules)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            return None
+    return multiprocessing.get_context()
+
+def worker_rules(rules):
+    """
+    プールの初期化時にワーカーへ渡すルールを返す関数(conversion_rulesはワーカーが読み込むためNone)
+    """
+    return None if rules is conversion_rules else rules
+
+@contextlib.contextmanager
+def worker_pool(rules, jobs, initializer):
+    """
+    ルールを渡したワーカープロセスのプールを作成する関数(jobs<=1やルールを渡せない場合はNone)
+    initializerはワーカーの起動時にworker_rules(rules)を引数として呼び出す
+    forkで起動した子プロセスが停止しないよう、ログを書き込むスレッド等を開始する前に作成する
+    """
+    context = worker_context(rules) if jobs > 1 else None
+    if context is None:
+        yield None
+        return
+    with context.Pool(processes=jobs, initializer=initializer, initargs=(worker_rules(rules),)) as pool:
+        yield pool
 
-    tree.write(file_path, encoding='utf-8', xml_declaration=True, pretty_print=True)
+# 並列処理のワーカープロセスで使用するルール(ワーカーの起動時に_init_part_workerで設定する)
+_part_worker_rules = conversion_rules
 
-def process_document_file(document_file, log_file, rules):
+def _init_part_worker(rules):
     """
-    document.xmlに対して変換を行う関数
+    ワーカープロセスの起動時に、使用するルールを設定してコンパイルしておく
     """
-    tree = ET.parse(document_file)
+    global _part_worker_rules
+    _part_worker_rules = conversion_rules if rules is None else rules
+    compile_rules(_part_worker_rules)
+
+def part_worker_pool(rules, jobs):
+    """
+    パーツを並列に変換するプロセスプールを作成する関数(worker_poolを参照)
+    """
+    return worker_pool(rules, jobs, _init_part_worker)
+
+def _proofread_part_in_worker(task):
+    """
+    ワーカープロセスで1つのパーツを変換し、変換後のバイト列・変更記録・統計を返す関数
+    変更しなかったパーツは、親プロセスへ送り返さないよう空のバイト列を返す
+    """
+    xml_bytes, stream, coalesce = task
+    engine = compile_rules(_part_worker_rules)
+    engine.reset_stats()
+    log_file = ChangeRecordBuffer()
+    data = process_xml_bytes(xml_bytes, log_file, _part_worker_rules, stream=stream, coalesce=coalesce)
+    return (data if data is not xml_bytes else b''), log_file.records, engine.get_stats()
+
+def _node_stats(stats):
+    """
+    統計のうち、キャッシュに保存するテキストノード数・ランの統合の統計・ルールごとの変更数のみを取り出す関数
+    """
+    return {name: value for name, value in stats.items() if not name.startswith('cache_')}
+
+def proofread_part_bytes(xml_bytes, log_file, rules, stream=False, part_cache=None, paragraph_cache=None,
+                         coalesce=False):
+    """
+    1つのパーツを変換する関数
+    part_cacheを指定した場合、内容とルールが同じパーツは以前の校閲結果を再利用する
+    paragraph_cacheを指定した場合、変更された段落のみにルールを適用する
+    coalesce=Trueの場合は各段落の変換の前に、書式が同じで隣り合うランを1つにまとめる
+    変更しなかったパーツは元のバイト列をそのまま返す(キャッシュには空のバイト列として保存する)
+    """
+    if part_cache is None:
+        return process_xml_bytes(xml_bytes, log_file, rules, stream=stream, paragraph_cache=paragraph_cache,
+                                 coalesce=coalesce)
+
+    engine = compile_rules(rules)
+    key = part_cache.make_key(xml_bytes, engine.fingerprint, stream=stream, coalesce=coalesce)
+    cached = part_cache.load(key)
+    if cached is not None:
+        data, records, stats = cached
+        replay_changes(log_file, records)
+        engine.add_stats(stats)
+        if paragraph_cache is not None:
+            # 段落キャッシュを参照しなかったパーツの段落の結果も、次回の実行に引き継ぐ
+            paragraph_cache.keep_part(key)
+        return data or xml_bytes
+
+    before = engine.get_stats()
+    part_log = ChangeRecordBuffer()
+    with paragraph_cache.part(key) if paragraph_cache is not None else contextlib.nullcontext():
+        data = process_xml_bytes(xml_bytes, part_log, rules, stream=stream, paragraph_cache=paragraph_cache,
+                                 coalesce=coalesce)
+    stats = engine.stats_since(before)
+    part_cache.store(key, data if data is not xml_bytes else b'', part_log.records, _node_stats(stats))
+    replay_changes(log_file, part_log.records)
+    return data
+
+def proofread_parts_parallel(parts, log_file, rules, stream=False, jobs=2, part_cache=None, part_names=None,
+                             coalesce=False, pool=None):
+    """
+    互いに独立したパーツ(XMLのバイト列のリスト)をプロセスプールで並列に変換する関数
+    ログは入力したパーツの順に書き込み、変換後のバイト列をパーツの順に返す(変更しなかったパーツは元のバイト列)
+    part_cacheにあるパーツはワーカーに渡さず、キャッシュの内容を使用する
+    part_namesを指定した場合は、各パーツの変更記録にパーツ名を付与する
+    poolにはpart_worker_poolで作成したプールを指定する(省略した場合はこの関数内で作成する)
+    ワーカーにルールを渡せない場合(worker_contextを参照)は、1つのプロセス内で順に変換する
+    """
+    if pool is None:
+        with part_worker_pool(rules, min(jobs, len(parts))) as pool:
+            if pool is not None:
+                return proofread_parts_parallel(parts, log_file, rules, stream=stream, jobs=jobs,
+                                                part_cache=part_cache, part_names=part_names, coalesce=coalesce,
+                                                pool=pool)
+        results = []
+        for i, part in enumerate(parts):
+            if part_names is not None:
+                set_log_context(log_file, part=part_names[i])
+            results.append(proofread_part_bytes(part, log_file, rules, stream=stream, part_cache=part_cache,
+                                                coalesce=coalesce))
+        return results
+
+    engine = compile_rules(rules)
+    keys = [part_cache.make_key(part, engine.fingerprint, stream=stream, coalesce=coalesce) if part_cache else None
+            for part in parts]
+    outcomes = [part_cache.load(key) if part_cache else None for key in keys]
+    misses = [i for i, outcome in enumerate(outcomes) if outcome is None]
+    if misses:
+        tasks = [(parts[i], stream, coalesce) for i in misses]
+        for i, outcome in zip(misses, pool.map(_proofread_part_in_worker, tasks, chunksize=1)):
+            outcomes[i] = outcome
+            if part_cache:
+                data, records, stats = outcome
+                part_cache.store(keys[i], data, records, _node_stats(stats))
+
+    results = []
+    for i, (data, records, stats) in enumerate(outcomes):
+        if part_names is not None:
+            set_log_context(log_file, part=part_names[i])
+        replay_changes(log_file, records)
+        engine.add_stats(stats)
+        results.append(data or parts[i])
+    return results
+
+def print_skip_stats(engine):
+    """
+    対象文字を含まずルール適用を省略したテキストノード数を表示する関数
+    """
+    print(f"ルール適用を省略したテキストノード: {engine.nodes_skipped}/{engine.nodes_checked}")
+    lookups = engine.cache_hits + engine.cache_misses
+    if lookups:
+        print(f"変換結果キャッシュ: ヒット {engine.cache_hits} / ミス {engine.cache_misses} "
+              f"(ヒット率 {engine.cache_hits / lookups:.1%})")
+
+def print_coalesce_stats(engine):
+    """
+    ランの統合で削除したラン・<w:t>要素の数を表示する関数(ランの統合を行った場合のみ)
+    """
+    if engine.runs_checked:
+        print(f"ランの統合: {engine.runs_checked} → {engine.runs_checked - engine.runs_removed} ラン"
+              f"(<w:t>要素 {engine.texts_removed} 個を削減)")
+
+def print_rule_counts(rule_counts):
+    """
+    ルールごとの変更数を表示する関数
+    """
+    if rule_counts:
+        print("ルールごとの変更数:")
+    for name, count in sorted(rule_counts.items(), key=lambda item: -item[1]):
+        print(f"  {name}: {count}")
+
+def process_file_streaming(file_path, log_file, rules, paragraph_cache=None, coalesce=False):
+    """
+    XMLファイルをストリーミングで変換し、一時ファイル経由で置き換える関数
+    どの段落も変更しなかった場合は一時ファイルを削除して元のファイルを残し、Falseを返す
+    """
+    temp_path = file_path + '.tmp'
+    with profiler.stage('stream', engine=compile_rules(rules), bytes_read=os.path.getsize(file_path)) as stage:
+        modified = process_xml_stream(file_path, temp_path, log_file, rules, paragraph_cache, coalesce)
+        stage.bytes_written = os.path.getsize(temp_path)
+    if modified:
+        os.replace(temp_path, file_path)
+    else:
+        os.remove(temp_path)
+    return modified
+
+def process_part_file(file_path, log_file, rules, stream=False, paragraph_cache=None, coalesce=False):
+    """
+    校閲対象のパーツ(本文・ヘッダー・フッター・脚注等)のXMLファイルに対して変換を行う関数
+    stream=Trueの場合は文書全体を読み込まず、段落単位で変換・書き出しを行う
+    coalesce=Trueの場合は各段落の変換の前に、書式が同じで隣り合うランを1つにまとめる
+    パーツを変更した場合はTrueを返す
+    """
+    if stream:
+        return process_file_streaming(file_path, log_file, rules, paragraph_cache, coalesce)
+
+    with profiler.stage('parse', bytes_read=os.path.getsize(file_path)):
+        tree = ET.parse(file_path)
     root = tree.getroot()
-    
-    # 文書内の各段落を処理
-    for paragraph in root.findall('.//w:p', namespaces):
-        process_runs_in_paragraph(paragraph, log_file, rules)
-
-    tree.write(document_file, encoding='utf-8', xml_declaration=True, pretty_print=True)
-
-def process_all_files(log_filename):
-    """
-    footer.xmlとdocument.xmlを取得する関数
-    """
-    with open(log_filename, 'w', encoding='utf-8') as log_file:
-        # footer名称が含まれる全てのXMLファイルを取得
-        footer_files = glob.glob('**/*footer*.xml', recursive=True)
-        for file_path in footer_files:
-            process_footer_file(file_path, log_file, conversion_rules)
-        
-        # document.xmlの処理
-        document_file = 'xml_new/word/document.xml'
-        process_document_file(document_file, log_file, conversion_rules)
+
+    # パーツ内の各段落を処理
+    with profiler.stage('process', engine=compile_rules(rules)):
+        modified = process_root(root, log_file, rules, paragraph_cache, coalesce)
+
+    # 変更がなければ書き出さずに元のファイルを残す
+    if modified:
+        with profiler.stage('write') as stage:
+            data = serialize_tree(tree, read_xml_prolog(file_path))
+            with open(file_path, 'wb') as f:
+                f.write(data)
+            stage.bytes_written = len(data)
+    return modified
+
+def process_files_parallel(file_paths, log_file, rules, stream=False, jobs=2, part_cache=None, part_names=None,
+                           coalesce=False, pool=None):
+    """
+    複数のXMLファイルをプロセスプールで並列に変換し、変更したファイルのみ上書きする関数
+    ファイルごとに変更したかどうかのリストを返す
+    """
+    parts = []
+    for file_path in file_paths:
+        with open(file_path, 'rb') as f:
+            parts.append(f.read())
+    results = proofread_parts_parallel(parts, log_file, rules, stream=stream, jobs=jobs, part_cache=part_cache,
+                                       part_names=part_names, coalesce=coalesce, pool=pool)
+    modified = []
+    for file_path, part, data in zip(file_paths, parts, results):
+        modified.append(data is not part)
+        if data is not part:
+            with open(file_path, 'wb') as f:
+                f.write(data)
+    return modified
+
+def process_file_cached(file_path, log_file, rules, stream=False, part_cache=None, paragraph_cache=None,
+                        coalesce=False):
+    """
+    XMLファイルをキャッシュを使用して変換し、変更した場合のみ上書きする関数
+    ファイルを変更した場合はTrueを返す
+    """
+    with open(file_path, 'rb') as f:
+        original = f.read()
+    data = proofread_part_bytes(original, log_file, rules, stream=stream, part_cache=part_cache,
+                                paragraph_cache=paragraph_cache, coalesce=coalesce)
+    if data is original:
+        return False
+    with open(file_path, 'wb') as f:
+        f.write(data)
+    return True
+
+def process_all_files(log_filename, stream=False, jobs=1, xml_dir='xml_new', part_cache=None, paragraph_cache=None,
+                      log_format='text', document=None, coalesce=False):
+    """
+    展開済みディレクトリ内の校閲対象パーツ(本文・ヘッダー・フッター・脚注等)を変換する関数
+    校閲で変更したファイルのパスを返す(変更しなかったファイルは書き出さず、元の内容のまま残す)
+    jobs>1の場合は各パーツをプロセスプールで並列に変換する(paragraph_cacheは使用しない)
+    part_cacheを指定した場合は内容が変わっていないパーツの校閲を省略する
+    paragraph_cacheを指定した場合は前回の実行から変わった段落のみにルールを適用する
+    log_format='jsonl'の場合は変更記録を1行1件のJSONでログに書き込む(documentは記録に付与する文書名)
+    coalesce=Trueの場合は各段落の変換の前に、書式が同じで隣り合うランを1つにまとめる
+    """
+    engine = compile_rules(conversion_rules)
+    engine.reset_stats()
+    # [Content_Types].xmlとリレーションシップから、この文書の校閲対象パーツのみを取得
+    part_names = find_proofread_parts_in_dir(xml_dir)
+    processed_files = [os.path.join(xml_dir, *name.split('/')) for name in part_names]
+    # プロセスプールはログを書き込むスレッドより先に作成する
+    with part_worker_pool(conversion_rules, min(jobs, len(processed_files))) as pool, \
+            ChangeLogWriter(log_filename, log_format) as log_file:
+        set_log_context(log_file, document=document)
+        if pool is not None:
+            with profiler.stage('parts_parallel', engine=engine):
+                modified = process_files_parallel(processed_files, log_file, conversion_rules, stream=stream,
+                                                  jobs=jobs, part_cache=part_cache, part_names=part_names,
+                                                  coalesce=coalesce, pool=pool)
+        elif part_cache is not None:
+            modified = []
+            for part_name, file_path in zip(part_names, processed_files):
+                set_log_context(log_file, part=part_name)
+                with profiler.stage('part', part=part_name, engine=engine):
+                    modified.append(process_file_cached(file_path, log_file, conversion_rules, stream=stream,
+                                                        part_cache=part_cache, paragraph_cache=paragraph_cache,
+                                                        coalesce=coalesce))
+        else:
+            modified = []
+            for part_name, file_path in zip(part_names, processed_files):
+                set_log_context(log_file, part=part_name)
+                with profiler.stage('part', part=part_name, engine=engine):
+                    modified.append(process_part_file(file_path, log_file, conversion_rules, stream=stream,
+                                                      paragraph_cache=paragraph_cache, coalesce=coalesce))
+        set_log_context(log_file, part=None)
+        write_change(log_file, make_rule_counts_record(engine.rule_counts))
+    print_skip_stats(engine)
+    print_coalesce_stats(engine)
+    print_rule_counts(engine.rule_counts)
+    return [file_path for file_path, part_modified in zip(processed_files, modified) if part_modified]
 
 # # 実行部分
 # process_all_files('conversion_rules_log.txt')
\ No newline at end of file
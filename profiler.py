@@ -0,0 +1,207 @@
+"""
+このファイルでは処理の段階(展開・解析・変換・書き出し・再構成など)ごとに、
+処理時間・CPU時間・メモリ使用量・読み書きしたバイト数・テキストノード数を記録します。
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windowsでは最大RSSを記録しない
+    resource = None
+
+def peak_rss_mb():
+    """
+    プロセスの最大RSS(MB)を返す(取得できない場合はNone)
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト単位、Linuxはキロバイト単位
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+def cpu_seconds():
+    """
+    このプロセスと終了済みの子プロセス(並列処理のワーカー)のCPU時間の合計を返す
+    """
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+class _NullStage:
+    """
+    計測が無効な場合に使用する、何も記録しない段階
+    """
+    bytes_read = 0
+    bytes_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    """
+    1つの段階の計測(withブロックの開始から終了まで)
+    """
+
+    def __init__(self, profiler, name, document, part, engine, bytes_read):
+        self.profiler = profiler
+        self.engine = engine
+        self.bytes_read = bytes_read
+        self.bytes_written = 0
+        self.traced_peak = 0
+        parent = profiler._stack[-1] if profiler._stack else None
+        self.record = {
+            'stage': name,
+            'document': document if document is not None else (parent.record['document'] if parent else None),
+            'part': part if part is not None else (parent.record['part'] if parent else None),
+            'depth': len(profiler._stack),
+        }
+
+    def __enter__(self):
+        profiler = self.profiler
+        if profiler.tracemalloc and profiler._stack:
+            # 外側の段階の最大値を引き継いでから、この段階の最大値を測り直す
+            parent = profiler._stack[-1]
+            parent.traced_peak = max(parent.traced_peak, tracemalloc.get_traced_memory()[1])
+        if profiler.tracemalloc:
+            tracemalloc.reset_peak()
+        profiler._stack.append(self)
+        profiler.records.append(self.record)
+        self.nodes_before = self.engine.get_stats() if self.engine is not None else None
+        self.cpu_start = cpu_seconds()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self.wall_start
+        cpu = cpu_seconds() - self.cpu_start
+        profiler = self.profiler
+        profiler._stack.pop()
+        self.record.update(
+            wall_seconds=wall,
+            cpu_seconds=cpu,
+            peak_rss_mb=peak_rss_mb(),
+            bytes_read=self.bytes_read,
+            bytes_written=self.bytes_written,
+        )
+        if profiler.tracemalloc:
+            self.traced_peak = max(self.traced_peak, tracemalloc.get_traced_memory()[1])
+            self.record['tracemalloc_peak_mb'] = self.traced_peak / (1 << 20)
+            if profiler._stack:
+                parent = profiler._stack[-1]
+                parent.traced_peak = max(parent.traced_peak, self.traced_peak)
+        if self.nodes_before is not None:
+            after = self.engine.get_stats()
+            self.record['nodes_checked'] = after['nodes_checked'] - self.nodes_before['nodes_checked']
+            self.record['nodes_changed'] = after['nodes_changed'] - self.nodes_before['nodes_changed']
+        if exc_type is not None:
+            self.record['error'] = str(exc_value)
+        return False
+
+class Profiler:
+    """
+    段階ごとの計測結果を記録する
+    start()を呼ぶまでは無効で、stage()は何も記録しない(通常の実行には影響しない)
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.tracemalloc = False
+        self.records = []
+        self._stack = []
+
+    def start(self, trace_memory=False):
+        """
+        計測を開始する
+        trace_memory=Trueの場合はtracemallocでPythonオブジェクトのメモリ使用量の最大値も記録する(処理は遅くなる)
+        """
+        self.enabled = True
+        self.tracemalloc = trace_memory
+        self.records = []
+        self._stack = []
+        if trace_memory:
+            tracemalloc.start()
+
+    def stop(self):
+        """
+        計測を終了する
+        """
+        self.enabled = False
+        if self.tracemalloc:
+            tracemalloc.stop()
+            self.tracemalloc = False
+
+    def stage(self, name, document=None, part=None, engine=None, bytes_read=0):
+        """
+        withブロックの処理を1つの段階として計測する
+        documentとpartを省略した場合は外側の段階の値を引き継ぐ
+        engine(CompiledRules)を指定した場合は、判定・変更したテキストノード数も記録する
+        書き出したバイト数は、返されたオブジェクトのbytes_writtenに設定する
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, document, part, engine, bytes_read)
+
+    def summary(self):
+        """
+        段階名ごとに回数・時間・バイト数・ノード数を合計し、メモリ使用量は最大値をとる
+        """
+        totals = {}
+        for record in self.records:
+            if 'wall_seconds' not in record:
+                continue
+            total = totals.setdefault(record['stage'], {'stage': record['stage'], 'count': 0, 'wall_seconds': 0.0,
+                                                        'cpu_seconds': 0.0, 'bytes_read': 0, 'bytes_written': 0,
+                                                        'nodes_checked': 0, 'nodes_changed': 0, 'peak_rss_mb': None,
+                                                        'tracemalloc_peak_mb': None})
+            total['count'] += 1
+            for name in ('wall_seconds', 'cpu_seconds', 'bytes_read', 'bytes_written', 'nodes_checked',
+                         'nodes_changed'):
+                total[name] += record.get(name, 0)
+            for name in ('peak_rss_mb', 'tracemalloc_peak_mb'):
+                if record.get(name) is not None:
+                    total[name] = max(total[name] or 0, record[name])
+        return list(totals.values())
+
+    def report(self):
+        """
+        計測結果をJSONに変換できる辞書で返す
+        """
+        return {'stages': self.records, 'summary': self.summary()}
+
+    def write_json(self, filename):
+        """
+        計測結果をJSONファイルに書き込む
+        """
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    def format_table(self):
+        """
+        段階名ごとの集計を表形式の行にする
+        """
+        lines = [f"{'段階':<26}{'回数':>6}{'実時間(秒)':>12}{'CPU(秒)':>10}{'最大RSS(MB)':>13}"
+                 f"{'読込(MB)':>10}{'書込(MB)':>10}{'ノード':>10}"]
+        for total in self.summary():
+            peak = f"{total['peak_rss_mb']:.1f}" if total['peak_rss_mb'] is not None else '-'
+            if total['tracemalloc_peak_mb'] is not None:
+                peak += f" ({total['tracemalloc_peak_mb']:.1f})"
+            lines.append(
+                f"{total['stage']:<26}{total['count']:>6}{total['wall_seconds']:>12.3f}{total['cpu_seconds']:>10.3f}"
+                f"{peak:>13}{total['bytes_read'] / (1 << 20):>10.2f}{total['bytes_written'] / (1 << 20):>10.2f}"
+                f"{total['nodes_checked']:>10}")
+        return lines
+
+# 全ての段階で共有する計測結果(main.pyの--profileで有効にする)
+profiler = Profiler()
@@ -0,0 +1,31 @@
+"""
+このファイルでは他のプログラムから呼び出すための校閲関数を提供します。
+インポート時にはファイルの読み書きを行わないため、一度インポートしたあと繰り返し呼び出せます。
+
+    from proofread import proofread_docx
+    result = proofread_docx('入力.docx', '【校閲ずみ】入力.docx')
+"""
+
+from change_log import ChangeLogWriter, ChangeRecordBuffer, replay_changes
+from process import conversion_rules
+from proofread_in_memory import proofread_docx_stream
+
+def proofread_docx(input_docx, output_docx, rules=conversion_rules, log_filename=None, log_format='text',
+                   stream=False, part_jobs=1, part_cache=None, paragraph_cache=None, coalesce=False):
+    """
+    wordファイルを校閲してoutput_docxに出力し、統計と変更記録をまとめた辞書を返す
+    input_docx・output_docxにはパスのほか、バイナリモードのファイルオブジェクトも指定できる
+    rulesにはconversion_rulesと同じ形式のルールのリストを指定する(コンパイル結果はリストごとに再利用する)
+    log_filenameを指定した場合は変更記録をログファイルにも書き込む
+    coalesce=Trueの場合は変換の前に、書式が同じで隣り合うランを1つにまとめる(統計の'runs_removed'等に削減数が入る)
+    戻り値の'changes'は変更記録のリスト、'rule_counts'はルールごとの変更数
+    wordファイルやXMLが壊れている場合は例外(zipfile.BadZipFile・lxml.etree.XMLSyntaxError)を送出する
+    """
+    records = ChangeRecordBuffer()
+    result = proofread_docx_stream(input_docx, output_docx, records, rules, stream=stream, part_jobs=part_jobs,
+                                   part_cache=part_cache, paragraph_cache=paragraph_cache, coalesce=coalesce)
+    if log_filename is not None:
+        with ChangeLogWriter(log_filename, log_format) as log_file:
+            replay_changes(log_file, records.records)
+    result['changes'] = [record for record in records.records if record['type'] == 'change']
+    return result
@@ -0,0 +1,141 @@
+"""
+このファイルではwordファイルをディスクに展開せず、メモリ上で校閲を行います。
+"""
+
+import os
+import shutil
+import zipfile
+from change_log import ChangeLogWriter, make_rule_counts_record, set_log_context, write_change
+from docx_archive import copy_member_raw
+from docx_parts import find_proofread_parts_in_zip
+from process import (conversion_rules, part_worker_pool, proofread_part_bytes, proofread_parts_parallel,
+                     print_coalesce_stats, print_skip_stats, print_rule_counts)
+from profiler import profiler
+from rule_engine import compile_rules
+
+def _is_path(docx_file):
+    """
+    ファイルオブジェクトではなくパスが指定されているかどうか
+    """
+    return isinstance(docx_file, (str, os.PathLike))
+
+def _document_name(docx_file):
+    """
+    変更記録に付与する文書名を返す(パスでないファイルオブジェクトは、そのname属性)
+    """
+    if _is_path(docx_file):
+        return os.fspath(docx_file)
+    name = getattr(docx_file, 'name', None)
+    return name if isinstance(name, str) else None
+
+def _file_size(docx_file):
+    """
+    ファイルのサイズを返す(パスでない場合は0)
+    """
+    if _is_path(docx_file):
+        return os.path.getsize(docx_file)
+    return 0
+
+def proofread_docx_stream(docx_file, output_docx, log_file, rules=conversion_rules, stream=False, part_jobs=1,
+                          part_cache=None, paragraph_cache=None, coalesce=False, pool=None):
+    """
+    開いているログファイルに変換内容を書き込みながら、wordファイルをメモリ上で校閲する
+    part_jobs>1の場合は本文・ヘッダー・フッター等のパーツをプロセスプールで並列に変換する
+    (poolにはprocess.part_worker_poolで作成したプールを指定できる)
+    part_cacheを指定した場合は内容が変わっていないパーツの校閲結果を再利用する
+    paragraph_cacheを指定した場合は前回の実行から変わった段落のみにルールを適用する(並列時を除く)
+    coalesce=Trueの場合は各段落の変換の前に、書式が同じで隣り合うランを1つにまとめる
+    docx_file・output_docxにはパスのほか、バイナリモードのファイルオブジェクトも指定できる
+    変更したパーツのみ圧縮し直し、どのパーツも変更しなかった場合(パスを指定した場合)は元のファイルを複製する
+    テキストノードの統計(判定数・省略数・変更数)と変更したパーツの数('parts_modified')を返す
+    """
+    engine = compile_rules(rules)
+    engine.reset_stats()
+    part_cache_hits = part_cache.hits if part_cache else 0
+    document_name = _document_name(docx_file)
+    set_log_context(log_file, document=document_name)
+    with profiler.stage('document', document=document_name, engine=engine,
+                        bytes_read=_file_size(docx_file)) as document_stage:
+        with zipfile.ZipFile(docx_file, 'r') as src:
+            # [Content_Types].xmlとリレーションシップから校閲対象のパーツを特定する
+            target_names = set(find_proofread_parts_in_zip(src))
+            targets = [info for info in src.infolist() if info.filename in target_names]
+            parts = [src.read(info) for info in targets]
+            if part_jobs > 1 and len(targets) > 1:
+                part_names = [info.filename for info in targets]
+                with profiler.stage('parts_parallel', engine=engine):
+                    results = proofread_parts_parallel(parts, log_file, rules, stream=stream, jobs=part_jobs,
+                                                       part_cache=part_cache, part_names=part_names,
+                                                       coalesce=coalesce, pool=pool)
+            else:
+                results = []
+                for info, part in zip(targets, parts):
+                    with profiler.stage('part', part=info.filename, engine=engine, bytes_read=info.compress_size):
+                        set_log_context(log_file, part=info.filename)
+                        results.append(proofread_part_bytes(part, log_file, rules, stream=stream,
+                                                            part_cache=part_cache, paragraph_cache=paragraph_cache,
+                                                            coalesce=coalesce))
+            # 変更しなかったパーツは元のバイト列がそのまま返る
+            modified = {info.filename: data for info, part, data in zip(targets, parts, results) if data is not part}
+            parts_modified = len(modified)
+            del parts, results  # 書き出しの間は変更したパーツのみ保持する
+
+            if not modified and _is_path(docx_file) and _is_path(output_docx):
+                # どのパーツも変更しなかった場合は元のファイルをそのまま複製する
+                with profiler.stage('copy_file', bytes_read=_file_size(docx_file)):
+                    shutil.copyfile(docx_file, output_docx)
+            else:
+                with zipfile.ZipFile(output_docx, 'w', zipfile.ZIP_DEFLATED) as dst:
+                    for info in src.infolist():
+                        data = modified.pop(info.filename, None)
+                        if data is not None:
+                            # 校閲で変更されたパーツのみ圧縮し直す
+                            with profiler.stage('write_part', part=info.filename) as stage:
+                                dst.writestr(info, data, compress_type=zipfile.ZIP_DEFLATED)
+                                stage.bytes_written = dst.infolist()[-1].compress_size
+                        else:
+                            # 変更しなかったパーツ・校閲対象外のパーツ(画像・フォント等)は圧縮済みのまま複製する
+                            with profiler.stage('copy_raw', part=info.filename,
+                                                bytes_read=info.compress_size) as stage:
+                                copy_member_raw(src, dst, info)
+                                stage.bytes_written = info.compress_size
+        document_stage.bytes_written = _file_size(output_docx)
+    stats = engine.get_stats()
+    stats['parts_modified'] = parts_modified
+    # 文書全体でのルールごとの変更数を記録する
+    set_log_context(log_file, part=None)
+    write_change(log_file, make_rule_counts_record(stats['rule_counts']))
+    if part_cache:
+        stats['part_cache_hits'] = part_cache.hits - part_cache_hits
+    return stats
+
+def proofread_docx_in_memory(docx_file, output_docx, log_filename, rules=conversion_rules, stream=False, part_jobs=1,
+                             part_cache=None, paragraph_cache=None, log_format='text', coalesce=False):
+    """
+    wordファイルを一度だけ開き、校閲対象のパーツのみを解析・変換して出力先へ直接書き出す
+    log_format='jsonl'の場合は変更記録を1行1件のJSONでログに書き込む
+    """
+    if docx_file is None:
+        print("有効な.docxファイルが指定されていません")
+        return
+
+    # プロセスプールはログを書き込むスレッドより先に作成する
+    with part_worker_pool(rules, part_jobs) as pool, ChangeLogWriter(log_filename, log_format) as log_file:
+        stats = proofread_docx_stream(docx_file, output_docx, log_file, rules, stream=stream, part_jobs=part_jobs,
+                                      part_cache=part_cache, paragraph_cache=paragraph_cache, coalesce=coalesce,
+                                      pool=pool)
+    if stats['parts_modified']:
+        print(f"{docx_file} をメモリ上で校閲し、{output_docx} に出力しました。")
+    else:
+        print(f"変更箇所がないため、{docx_file} を {output_docx} にそのまま複製しました。")
+    engine = compile_rules(rules)
+    print_skip_stats(engine)
+    print_coalesce_stats(engine)
+    print_rule_counts(engine.rule_counts)
+
+if __name__ == "__main__":
+    from make_xml_from_wordfile import get_docx_file
+    docx_file = get_docx_file("data")
+    if docx_file is not None:
+        core_filename = os.path.splitext(os.path.basename(docx_file))[0]
+        proofread_docx_in_memory(docx_file, f"【校閲ずみ】{core_filename}.docx", 'conversion_rules_log.txt')
@@ -5,23 +5,50 @@
 import zipfile
 import os
 from make_xml_from_wordfile import get_docx_file
+from docx_archive import copy_member_raw
 
-# パスの設定
-file_path = get_docx_file("data")
-core_filename = os.path.splitext(os.path.basename(file_path))[0]
-xml_dir = 'xml_new'  # 解凍先のフォルダ
-output_docx = f"【校閲ずみ】{core_filename}.docx"  # 出力するWordファイル
-
-def create_docx(folder_path, output_docx):
+def create_docx(folder_path, output_docx, source_docx=None, modified_parts=None):
     """
     xmlファイルをwordファイルに変換する
+    source_docxを指定した場合、modified_partsに含まれないパーツは元のwordファイルから圧縮済みのまま複製する
     """
-    with zipfile.ZipFile(output_docx, 'w', zipfile.ZIP_DEFLATED) as docx:
+    if source_docx is None:
+        with zipfile.ZipFile(output_docx, 'w', zipfile.ZIP_DEFLATED) as docx:
+            for foldername, subfolders, filenames in os.walk(folder_path):
+                for filename in filenames:
+                    file_path = os.path.join(foldername, filename)
+                    arcname = os.path.relpath(file_path, folder_path)
+                    docx.write(file_path, arcname)
+        return
+
+    modified_parts = set(modified_parts or [])
+    with zipfile.ZipFile(source_docx, 'r') as src, \
+            zipfile.ZipFile(output_docx, 'w', zipfile.ZIP_DEFLATED) as docx:
+        copied = set()
+        for info in src.infolist():
+            file_path = os.path.join(folder_path, *info.filename.split('/'))
+            if info.filename in modified_parts and os.path.isfile(file_path):
+                # 校閲で変更されたパーツのみ圧縮し直す
+                docx.write(file_path, info.filename)
+            else:
+                copy_member_raw(src, docx, info)
+            copied.add(info.filename)
+
+        # 元のwordファイルに存在しないファイルを追加する
         for foldername, subfolders, filenames in os.walk(folder_path):
             for filename in filenames:
                 file_path = os.path.join(foldername, filename)
-                arcname = os.path.relpath(file_path, folder_path)
-                docx.write(file_path, arcname)
+                arcname = os.path.relpath(file_path, folder_path).replace(os.sep, '/')
+                if arcname not in copied:
+                    docx.write(file_path, arcname)
+
+
+if __name__ == "__main__":
+    # パスの設定
+    file_path = get_docx_file("data")
+    core_filename = os.path.splitext(os.path.basename(file_path))[0]
+    xml_dir = 'xml_new'  # 解凍先のフォルダ
+    output_docx = f"【校閲ずみ】{core_filename}.docx"  # 出力するWordファイル
 
-# 再度ZIPファイルとしてまとめる
-create_docx(xml_dir, output_docx)
\ No newline at end of file
+    # 再度ZIPファイルとしてまとめる
+    create_docx(xml_dir, output_docx)
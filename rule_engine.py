@@ -0,0 +1,671 @@
+"""
+このファイルではconversion_rulesをコンパイルし、少ない走査回数で適用するルールエンジンを提供します。
+"""
+
+import hashlib
+import types
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from collections import OrderedDict
+import regex as re  # regexモジュールを使用
+
+# check_japanese が有効なルールで使用する日本語判定パターン
+JAPANESE_PATTERN = re.compile(r'[ぁ-んァ-ヶ一-龠]')
+
+# 1文字だけにマッチし、前後の文脈を参照しないパターン(例: [０-９], ([！＂]), \+)
+SINGLE_CHAR_PATTERN = re.compile(r'''
+    ^(?P<open>\()?
+    (?P<atom>\[\^?\]?(?:\\.|[^\]\\])*\]|\\[^\d]|[^\\\[\]().|*+?{}^$])
+    (?(open)\))$
+''', re.VERBOSE)
+
+# パターン先頭の1文字分の要素(文字クラス・エスケープ・リテラル)
+LEADING_ATOM_PATTERN = re.compile(r'\[\^?\]?(?:\\.|[^\]\\])*\]|\\u[0-9A-Fa-f]{4}|\\.|[^\\\[\]().|*+?{}^$]')
+
+# 文字クラス内のエスケープのうち、1文字そのものを表すもの
+_CLASS_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'f': '\f', 'v': '\v'}
+
+# 変換表に展開する文字クラスの最大文字数
+MAX_CHAR_MAP_SIZE = 0x3000
+
+def is_single_char_rule(rule):
+    """
+    前後の文脈を参照せず、1文字単位で置換するルールかどうかを判定する
+    """
+    if rule.get('check_japanese'):
+        return False
+    return SINGLE_CHAR_PATTERN.match(rule['pattern']) is not None
+
+def _read_class_char(body, pos):
+    """
+    文字クラス内の1文字を読み取り、(文字, 次の位置)を返す
+    \\d のような複数文字を表すエスケープの場合はNoneを返す
+    """
+    char = body[pos]
+    if char != '\\':
+        return char, pos + 1
+    escaped = body[pos + 1]
+    if escaped == 'u' and len(body) >= pos + 6:
+        return chr(int(body[pos + 2:pos + 6], 16)), pos + 6
+    if escaped in _CLASS_ESCAPES:
+        return _CLASS_ESCAPES[escaped], pos + 2
+    if escaped.isalnum():
+        return None
+    return escaped, pos + 2
+
+def char_class_members(pattern):
+    """
+    1文字単位のルールのパターンがマッチし得る文字を列挙する
+    列挙できない場合(否定クラス・\\d等・範囲が広すぎる場合)はNoneを返す
+    """
+    match = SINGLE_CHAR_PATTERN.match(pattern)
+    if match is None:
+        return None
+    return atom_members(match.group('atom'))
+
+def atom_members(atom):
+    """
+    文字クラス・エスケープ・リテラル1文字がマッチし得る文字を列挙する
+    """
+    if not atom.startswith('['):
+        read = _read_class_char(atom, 0)
+        return None if read is None else [read[0]]
+    if atom.startswith('[^'):
+        return None
+
+    body = atom[1:-1]
+    members = []
+    pos = 0
+    while pos < len(body):
+        read = _read_class_char(body, pos)
+        if read is None:
+            return None
+        start, pos = read
+        if pos + 1 < len(body) and body[pos] == '-':
+            read = _read_class_char(body, pos + 1)
+            if read is None:
+                return None
+            end, pos = read
+            if ord(end) - ord(start) > MAX_CHAR_MAP_SIZE:
+                return None
+            members.extend(chr(code) for code in range(ord(start), ord(end) + 1))
+        else:
+            members.append(start)
+    return members
+
+def _skip_group(pattern, pos):
+    """
+    pos の開きカッコに対応する閉じカッコの次の位置を返す
+    """
+    depth = 0
+    in_class = False
+    while pos < len(pattern):
+        char = pattern[pos]
+        if char == '\\':
+            pos += 2
+            continue
+        if in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return pos + 1
+        pos += 1
+    return None
+
+def _has_alternation(pattern):
+    """
+    文字クラスの外に選択(|)が含まれるかどうかを判定する
+    """
+    in_class = False
+    pos = 0
+    while pos < len(pattern):
+        char = pattern[pos]
+        if char == '\\':
+            pos += 2
+            continue
+        if in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '|':
+            return True
+        pos += 1
+    return False
+
+def leading_chars(pattern):
+    """
+    パターンのマッチが必ず含む先頭の1文字の候補を返す
+    先読み・後読みは読み飛ばし、判定できない場合はNoneを返す
+    """
+    if _has_alternation(pattern):
+        return None
+    pos = 0
+    while pattern.startswith(('(?=', '(?!', '(?<=', '(?<!'), pos):
+        pos = _skip_group(pattern, pos)
+        if pos is None:
+            return None
+    if pattern.startswith('(?:', pos):
+        pos += 3
+    elif pattern.startswith('(', pos) and not pattern.startswith('(?', pos):
+        pos += 1
+
+    match = LEADING_ATOM_PATTERN.match(pattern, pos)
+    if match is None:
+        return None
+    # 0回の繰り返しを許す量指定子が続く場合は必ず含まれるとは言えない
+    if pattern.startswith(('*', '?', '{0'), match.end()):
+        return None
+    return atom_members(match.group())
+
+def build_char_map(rule):
+    """
+    1文字単位のルールをstr.translate用の変換表に展開する
+    展開できない場合はNoneを返す
+    """
+    if not is_single_char_rule(rule):
+        return None
+    members = char_class_members(rule['pattern'])
+    if members is None:
+        return None
+
+    pattern = re.compile(rule['pattern'])
+    replace = rule['replace']
+    table = {}
+    for char in members:
+        match = pattern.fullmatch(char)
+        if match is None:
+            # パターンの解釈が列挙結果と食い違う場合は正規表現で処理する
+            return None
+        replaced = replace(match) if callable(replace) else match.expand(replace)
+        if replaced != char:
+            table[ord(char)] = replaced
+    return table
+
+class _TranslateStage:
+    """
+    連続する文字変換ルールをまとめたstr.translateによるステージ
+    """
+
+    def __init__(self, index, table):
+        self.indices = [index]
+        self.table = dict(table)
+        # 文字ごとに、その文字を変換するルールの番号(適用順)
+        self.code_rules = {code: [index] for code in table}
+        self._finder = None
+
+    def add(self, index, table):
+        # 逐次適用と同じく、既存の変換結果にも後続ルールを適用する
+        for code, replaced in self.table.items():
+            chained = ''.join(table.get(ord(char), char) for char in replaced)
+            if chained != replaced:
+                self.table[code] = chained
+                self.code_rules[code].append(index)
+        for code, replaced in table.items():
+            if code not in self.table:
+                self.table[code] = replaced
+                self.code_rules[code] = [index]
+        self.indices.append(index)
+        self._finder = None
+
+    def apply(self, text, edits):
+        result = text.translate(self.table)
+        if result != text:
+            # 変換があった場合のみ、変換された文字の位置とルールを記録する
+            if self._finder is None:
+                self._finder = re.compile('[' + ''.join(re.escape(chr(code)) for code in self.table) + ']')
+            for match in self._finder.finditer(text):
+                code = ord(match.group())
+                for index in self.code_rules[code]:
+                    edits.append((index, match.start(), match.end(), self.table[code]))
+        return result
+
+class _RuleStage:
+    """
+    1回の走査で適用されるルールの集まり
+    先頭のルールは任意のパターン、2番目以降は1文字単位のルールのみを含む
+    """
+
+    def __init__(self, rules, indices):
+        self.rules = [rules[i] for i in indices]
+        self.indices = indices
+        self.patterns = [re.compile(rule['pattern']) for rule in self.rules]
+        if len(self.rules) == 1:
+            self.pattern = self.patterns[0]
+        else:
+            # 名前付きグループでどのルールにマッチしたかを判別する
+            self.pattern = re.compile('|'.join(
+                f'(?P<r{n}>{rule["pattern"]})' for n, rule in enumerate(self.rules)))
+
+    def _replace(self, n, match):
+        replace = self.rules[n]['replace']
+        return replace(match) if callable(replace) else match.expand(replace)
+
+    def _single(self, match, edits):
+        replaced = self._replace(0, match)
+        if replaced != match.group():
+            edits.append((self.indices[0], match.start(), match.end(), replaced))
+        return replaced
+
+    def _dispatch(self, match, edits):
+        n = int(match.lastgroup[1:])
+        # 各ルールの置換関数が想定するグループ番号で改めてマッチさせる
+        own_match = self.patterns[n].match(match.string, match.start())
+        replaced = self._replace(n, own_match)
+        fired = [self.indices[n]] if replaced != match.group() else []
+        # 逐次適用時と同じく、後続ルールを置換結果に適用する
+        for later in range(n + 1, len(self.rules)):
+            chained = self.patterns[later].sub(lambda m, later=later: self._replace(later, m), replaced)
+            if chained != replaced:
+                fired.append(self.indices[later])
+                replaced = chained
+        for index in fired:
+            edits.append((index, match.start(), match.end(), replaced))
+        return replaced
+
+    def apply(self, text, edits):
+        if self.rules[0]['check_japanese'] and not JAPANESE_PATTERN.search(text):
+            return text
+        if len(self.rules) == 1:
+            return self.pattern.sub(lambda m: self._single(m, edits), text)
+        return self.pattern.sub(lambda m: self._dispatch(m, edits), text)
+
+def _map_edits(edits, starts, ends, matches, length):
+    """
+    ステージ内の変更(ステージ入力での位置)を元のテキストでの位置に変換してmatchesに追加し、
+    ステージ出力の各文字が元のテキストのどの範囲に由来するか(開始位置, 終了位置)を返す
+    startsは末尾に終端位置を1つ余分に持つ
+    置換前後で長さが変わらない変更は、置換後のi文字目を置換前のi文字目の範囲に対応させ、
+    長さが変わる変更のみ、置換後の全ての文字を置換前の範囲全体に対応させる
+    starts・endsがNoneの場合は元のテキストと位置が一致している(lengthはステージ入力の長さ)ものとし、
+    長さが変わらない変更のみであれば、そのままNoneを返す
+    """
+    if starts is None:
+        if all(end - start == len(replacement) for _, start, end, replacement in edits):
+            matches.extend(edits)
+            return None, None
+        starts = list(range(length + 1))
+        ends = list(range(1, length + 1))
+    new_starts = []
+    new_ends = []
+    pos = 0
+    previous = None
+    for index, start, end, replacement in edits:
+        origin_start = starts[start]
+        origin_end = ends[end - 1] if end > start else origin_start
+        matches.append((index, origin_start, origin_end, replacement))
+        # 同じ範囲に複数のルールが適用された場合、置換は1回だけ行われている
+        if (start, end) == previous:
+            continue
+        previous = (start, end)
+        new_starts.extend(starts[pos:start])
+        new_ends.extend(ends[pos:start])
+        if end - start == len(replacement):
+            new_starts.extend(starts[start:end])
+            new_ends.extend(ends[start:end])
+        else:
+            new_starts.extend([origin_start] * len(replacement))
+            new_ends.extend([origin_end] * len(replacement))
+        pos = end
+    new_starts.extend(starts[pos:])
+    new_ends.extend(ends[pos:])
+    return new_starts, new_ends
+
+def _code_signature(code):
+    """
+    関数のコードから、実行ごとに変わらない内容(バイトコード・参照する名前・定数)を取り出す
+    入れ子の関数や内包表記のコードオブジェクトのreprにはアドレスが含まれるため、再帰的に内容を取り出す
+    """
+    return (code.co_code, code.co_names,
+            tuple(_code_signature(const) if isinstance(const, types.CodeType) else const for const in code.co_consts))
+
+def rules_fingerprint(rules):
+    """
+    ルールの内容(名前・パターン・置換処理)からルールセットのバージョンを表すハッシュ値を求める
+    """
+    digest = hashlib.sha256()
+    for rule in rules:
+        replace = rule['replace']
+        if callable(replace) and hasattr(replace, '__code__'):
+            replace = _code_signature(replace.__code__)
+        digest.update(repr((rule['name'], rule['pattern'], rule.get('check_japanese'),
+                            rule.get('color'), replace)).encode('utf-8'))
+    return digest.hexdigest()
+
+class ConversionCache:
+    """
+    テキストごとの変換結果(変換後テキストと、ルールごとの変更箇所)を保持するLRUキャッシュ
+    キーにはルールセットのバージョンを含むため、文書やパーツをまたいで共有できる
+    """
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def resize(self, maxsize):
+        """
+        保持する最大件数を変更する(0でキャッシュを無効化)
+        """
+        self.maxsize = maxsize
+        while len(self._entries) > max(maxsize, 0):
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+# 全ての文書・パーツで共有する変換結果のキャッシュ
+conversion_cache = ConversionCache()
+
+class CompiledRules:
+    """
+    conversion_rulesを走査回数が最小になるようステージにまとめたもの
+    適用結果はルールを先頭から順に1つずつ適用した場合と同一になる
+    """
+
+    def __init__(self, rules, cache=conversion_cache):
+        self.rules = rules
+        self.fingerprint = rules_fingerprint(rules)
+        self.cache = cache
+        self.stages = []
+        indices = []
+        for i, rule in enumerate(rules):
+            # 文字を1対1で置き換えるだけのルールはstr.translateで処理する
+            table = build_char_map(rule)
+            if table is not None:
+                if self.stages and isinstance(self.stages[-1], _TranslateStage) and not indices:
+                    self.stages[-1].add(i, table)
+                else:
+                    self._flush(indices)
+                    indices = []
+                    self.stages.append(_TranslateStage(i, table))
+                continue
+            # 1文字単位のルールは直前のステージに統合できる
+            if indices and is_single_char_rule(rule) and not rules[indices[0]].get('check_japanese'):
+                indices.append(i)
+                continue
+            self._flush(indices)
+            indices = [i]
+        self._flush(indices)
+        self.trigger_chars = self._build_trigger_chars()
+        self.reset_stats()
+
+    def _flush(self, indices):
+        if indices:
+            self.stages.append(_RuleStage(self.rules, indices))
+
+    def _build_trigger_chars(self):
+        """
+        いずれかのルールがマッチするために必要な文字の集合を求める
+        1つでも判定できないルールがある場合はNone(事前判定なし)とする
+        """
+        trigger_chars = set()
+        for stage in self.stages:
+            if isinstance(stage, _TranslateStage):
+                trigger_chars.update(chr(code) for code in stage.table)
+                continue
+            for rule in stage.rules:
+                chars = leading_chars(rule['pattern'])
+                if chars is None:
+                    return None
+                trigger_chars.update(chars)
+        return frozenset(trigger_chars)
+
+    def reset_stats(self):
+        """
+        事前判定の統計とルールごとの変更数をリセットする
+        """
+        self.nodes_checked = 0
+        self.nodes_skipped = 0
+        self.nodes_changed = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # ランの統合(coalesce_runs)で判定・削除したラン数と削除した<w:t>要素数
+        self.runs_checked = 0
+        self.runs_removed = 0
+        self.texts_removed = 0
+        self.rule_counts = {}
+
+    def get_stats(self):
+        """
+        事前判定の統計とルールごとの変更数(ルール名: 変更箇所数)を辞書で返す
+        """
+        return {
+            'nodes_checked': self.nodes_checked,
+            'nodes_skipped': self.nodes_skipped,
+            'nodes_changed': self.nodes_changed,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'runs_checked': self.runs_checked,
+            'runs_removed': self.runs_removed,
+            'texts_removed': self.texts_removed,
+            'rule_counts': dict(self.rule_counts),
+        }
+
+    def add_stats(self, stats):
+        """
+        別プロセスで集計した統計やキャッシュに保存された統計を加算する
+        """
+        self.nodes_checked += stats.get('nodes_checked', 0)
+        self.nodes_skipped += stats.get('nodes_skipped', 0)
+        self.nodes_changed += stats.get('nodes_changed', 0)
+        self.cache_hits += stats.get('cache_hits', 0)
+        self.cache_misses += stats.get('cache_misses', 0)
+        self.runs_checked += stats.get('runs_checked', 0)
+        self.runs_removed += stats.get('runs_removed', 0)
+        self.texts_removed += stats.get('texts_removed', 0)
+        for name, count in stats.get('rule_counts', {}).items():
+            self.rule_counts[name] = self.rule_counts.get(name, 0) + count
+
+    def stats_since(self, before):
+        """
+        get_statsで取得した時点から増えた分の統計を返す
+        """
+        stats = self.get_stats()
+        for name, value in before.items():
+            if name == 'rule_counts':
+                stats[name] = {rule: count - value.get(rule, 0) for rule, count in stats[name].items()
+                               if count != value.get(rule, 0)}
+            else:
+                stats[name] -= value
+        return stats
+
+    def count_rules(self, rule_indices):
+        """
+        適用されたルールの番号(変更箇所ごとに1つ)をルールごとの変更数に加算する
+        """
+        for index in rule_indices:
+            name = self.rules[index]['name']
+            self.rule_counts[name] = self.rule_counts.get(name, 0) + 1
+
+    def _lookup(self, text):
+        """
+        キャッシュを参照してテキストに全ルールを適用し、(変換後テキスト, 変更箇所, 元の位置)を返す
+        元の位置は変換後の各文字が由来する元のテキストでの開始位置の配列(末尾に終端位置を持つ)で、
+        変更がない場合・長さが変わらない置換のみの場合(位置が変わらない場合)はNone
+        """
+        key = (self.fingerprint, text)
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache_hits += 1
+            return entry
+        self.cache_misses += 1
+        converted = text
+        matches = []
+        starts = ends = None
+        for stage in self.stages:
+            edits = []
+            result = stage.apply(converted, edits)
+            if edits:
+                starts, ends = _map_edits(edits, starts, ends, matches, len(converted))
+            converted = result
+        matches.sort(key=lambda match: (match[1], match[2], match[0]))
+        entry = (converted, tuple(matches), array('i', starts) if starts is not None else None)
+        self.cache.put(key, entry)
+        return entry
+
+    def convert(self, text):
+        """
+        全ルールを適用したテキストと、変更箇所のタプルを返す
+        変更箇所は(ルールの番号, 元のテキストでの開始位置, 終了位置, 置換後の文字列)で、
+        ルールを適用する走査の中で記録するため、ルールごとに差分を取り直す必要はない
+        """
+        self.nodes_checked += 1
+        # 対象となり得る文字を含まないテキストはルールを適用せずに返す
+        if self.trigger_chars is not None and self.trigger_chars.isdisjoint(text):
+            self.nodes_skipped += 1
+            return text, ()
+
+        converted, matches, _ = self._lookup(text)
+        if converted != text:
+            self.nodes_changed += 1
+        self.count_rules(match[0] for match in matches)
+        return converted, matches
+
+    def convert_segments(self, segments):
+        """
+        連続する複数のテキスト(段落内の各w:tなど)を連結した文字列に1回で全ルールを適用し、
+        テキストごとに(変換後テキスト, 変更箇所のリスト)を返す
+        テキストの境界をまたぐパターン(隣のランを参照する先読み・後読みなど)も連結後の文字列で判定する
+        置換前後で長さが変わらない変更は、変換後の各文字を置換前の同じ位置の文字を含むテキストに割り当てるため、
+        書式の異なるランにまたがる変更でも各ランの文字数と書式は変わらない
+        変更箇所の位置はそれぞれのテキスト内での位置で、境界をまたぐ変更は開始位置を含むテキストに置換後の文字列を記録し、
+        後続のテキストには5番目の要素をTrue(継続部分)として、そのテキストに割り当てた置換後の文字列
+        (長さが変わる変更では空)を記録する
+        """
+        self.nodes_checked += len(segments)
+        if self.trigger_chars is not None:
+            skipped = sum(1 for segment in segments if self.trigger_chars.isdisjoint(segment))
+            self.nodes_skipped += skipped
+            if skipped == len(segments):
+                return [(segment, []) for segment in segments]
+
+        text = ''.join(segments)
+        converted, matches, origins = self._lookup(text)
+        self.count_rules(match[0] for match in matches)
+        if len(segments) == 1:
+            if converted != text:
+                self.nodes_changed += 1
+            return [(converted, list(matches))]
+        results = [(segment, []) for segment in segments]
+        if not matches:
+            return results
+
+        bounds = [0, *accumulate(len(segment) for segment in segments)]
+        if converted != text:
+            if origins is None:
+                converted_bounds = bounds
+            else:
+                # 変換後の文字は、その文字が由来する元の位置を含むテキストに割り当てる
+                converted_bounds = [bisect_left(origins, bound, 0, len(converted)) for bound in bounds[:-1]]
+                converted_bounds.append(len(converted))
+            for k, segment in enumerate(segments):
+                new_segment = converted[converted_bounds[k]:converted_bounds[k + 1]]
+                if new_segment != segment:
+                    self.nodes_changed += 1
+                    results[k] = (new_segment, [])
+
+        last = len(segments) - 1
+        for index, start, end, replacement in matches:
+            k = min(bisect_right(bounds, start) - 1, last)
+            if end <= bounds[k + 1] or k == last:
+                results[k][1].append((index, start - bounds[k], end - bounds[k], replacement))
+                continue
+            same_length = end - start == len(replacement)
+            head = replacement[:bounds[k + 1] - start] if same_length else replacement
+            results[k][1].append((index, start - bounds[k], bounds[k + 1] - bounds[k], head))
+            while k < last and end > bounds[k + 1]:
+                k += 1
+                segment_end = min(end, bounds[k + 1])
+                piece = replacement[bounds[k] - start:segment_end - start] if same_length else ''
+                results[k][1].append((index, 0, segment_end - bounds[k], piece, True))
+        return results
+
+    def find_changes(self, text):
+        """
+        全ルールを適用した結果、実際にテキストが変わる範囲のみを返す(テキストは書き換えない)
+        範囲は重なり合う変更箇所をまとめたもので、(開始位置, 終了位置, 全ルールを適用した後の文字列, ルールの番号のリスト)
+        後のルールで元に戻る変更(半角のカッコを全角にしたあと、カッコの校閲で半角に戻す等)は含まない
+        """
+        self.nodes_checked += 1
+        if self.trigger_chars is not None and self.trigger_chars.isdisjoint(text):
+            self.nodes_skipped += 1
+            return []
+
+        converted, matches, origins = self._lookup(text)
+        if converted == text:
+            return []
+        self.nodes_changed += 1
+        regions = []
+        for index, start, end, _ in matches:
+            if regions and start < regions[-1][1]:
+                regions[-1][1] = max(regions[-1][1], end)
+                regions[-1][2].append(index)
+            else:
+                regions.append([start, end, [index]])
+        changes = []
+        for start, end, indices in regions:
+            if origins is None:
+                after = converted[start:end]
+            else:
+                after = converted[bisect_left(origins, start, 0, len(converted)):
+                                  bisect_left(origins, end, 0, len(converted))]
+            if after != text[start:end]:
+                changes.append((start, end, after, indices))
+                self.count_rules(indices)
+        return changes
+
+    def apply(self, text):
+        """
+        全ルールを適用したテキストを返す
+        """
+        return self.convert(text)[0]
+
+    def describe_matches(self, matches):
+        """
+        convert・convert_segmentsが返した変更箇所を、ルール名を含む辞書のリストに変換する
+        """
+        described = []
+        for index, start, end, replacement, *continued in matches:
+            match = {'rule': index, 'name': self.rules[index]['name'], 'start': start, 'end': end,
+                     'replacement': replacement}
+            if continued:
+                match['continued'] = True
+            described.append(match)
+        return described
+
+_compiled_cache = {}
+
+def compile_rules(rules):
+    """
+    ルールのリストをコンパイルする(同じリストは再コンパイルしない)
+    """
+    if isinstance(rules, CompiledRules):
+        return rules
+    cached = _compiled_cache.get(id(rules))
+    if cached is None or cached.rules is not rules:
+        cached = CompiledRules(rules)
+        _compiled_cache[id(rules)] = cached
+    return cached
@@ -0,0 +1,217 @@
+"""
+このファイルでは校閲を常駐するローカルのHTTPサーバーとして提供します。
+起動時にルールをコンパイルしたワーカープロセスを用意しておくため、リクエストごとの起動・インポート・コンパイルの時間がかかりません。
+
+    python server.py --port 8765 --workers 4
+
+POST /proofread
+    本文に.docxファイルの内容を送ると、校閲後の.docx(base64)・統計・変更記録をJSONで返す
+    --path-root DIRを指定した場合は、Content-Type: application/json で {"input": "入力.docx", "output": "出力.docx"} を送ると、
+    DIR内のファイルを校閲してoutputに書き出し、統計・変更記録をJSONで返す(DIRの外のパスは指定できない)
+GET /health
+    サーバーの状態(ワーカー数・ルールのフィンガープリント)を返す
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from lxml import etree as ET
+from part_cache import PartCache
+from process import conversion_rules
+from proofread import proofread_docx
+from rule_engine import compile_rules, conversion_cache
+
+# 受け付ける.docxファイルの最大サイズ
+DEFAULT_MAX_BYTES = 100 * (1 << 20)
+
+# ワーカープロセスで使用するパーツキャッシュ(起動時に設定する)
+_worker_part_cache = None
+
+def _init_worker(cache_dir, text_cache_size):
+    """
+    ワーカープロセスの起動時にルールをコンパイルし、キャッシュを用意しておく
+    """
+    global _worker_part_cache
+    conversion_cache.resize(text_cache_size)
+    compile_rules(conversion_rules)
+    _worker_part_cache = PartCache(cache_dir) if cache_dir else None
+
+def _ping():
+    """
+    ワーカープロセスを起動しておくための何もしないタスク
+    """
+    return True
+
+def proofread_request(request):
+    """
+    1件の校閲リクエストを処理する(ワーカープロセスで実行する)
+    requestは{'docx': .docxのバイト列}または{'input': 入力のパス, 'output': 出力のパス}
+    wordファイルが壊れている(圧縮データの破損・暗号化を含む)・読み書きできない場合は{'error': 内容}を返す
+    """
+    try:
+        if 'docx' in request:
+            output = io.BytesIO()
+            result = proofread_docx(io.BytesIO(request['docx']), output, part_cache=_worker_part_cache)
+            result['docx'] = output.getvalue()
+        else:
+            result = proofread_docx(request['input'], request['output'], part_cache=_worker_part_cache)
+            result['output'] = request['output']
+    except (zipfile.BadZipFile, ET.XMLSyntaxError, OSError, zlib.error, EOFError, RuntimeError,
+            NotImplementedError) as e:
+        return {'error': str(e)}
+    return result
+
+class ProofreadServer(ThreadingHTTPServer):
+    """
+    校閲リクエストをワーカープロセスのプールで処理するHTTPサーバー
+    workers=0の場合はサーバーのプロセス内で1件ずつ処理する
+    path_rootを指定した場合のみ、そのディレクトリ内のファイルをパスで指定した校閲を受け付ける
+    """
+    daemon_threads = True
+
+    def __init__(self, address, workers=2, cache_dir=None, text_cache_size=conversion_cache.maxsize,
+                 max_bytes=DEFAULT_MAX_BYTES, path_root=None):
+        super().__init__(address, ProofreadRequestHandler)
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.path_root = os.path.realpath(path_root) if path_root is not None else None
+        self.fingerprint = compile_rules(conversion_rules).fingerprint
+        if workers > 0:
+            self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                initargs=(cache_dir, text_cache_size))
+            # 最初のリクエストを待たずにワーカーを起動しておく
+            self.executor.submit(_ping).result()
+        else:
+            self.executor = None
+            self._lock = threading.Lock()
+            _init_worker(cache_dir, text_cache_size)
+
+    def resolve_path(self, path):
+        """
+        リクエストで指定されたパス(path_rootからの相対パス)を実際のパスに変換する
+        シンボリックリンクを解決した結果がpath_rootの外になる場合はNoneを返す
+        """
+        resolved = os.path.realpath(os.path.join(self.path_root, path))
+        if os.path.commonpath([resolved, self.path_root]) != self.path_root:
+            return None
+        return resolved
+
+    def proofread(self, request):
+        """
+        校閲リクエストを処理し、結果を返す
+        """
+        if self.executor is not None:
+            return self.executor.submit(proofread_request, request).result()
+        # ルールエンジンの統計は共有されるため、同時に1件だけ処理する
+        with self._lock:
+            return proofread_request(request)
+
+    def server_close(self):
+        super().server_close()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+class ProofreadRequestHandler(BaseHTTPRequestHandler):
+    """
+    /proofread・/healthへのリクエストを処理する
+    """
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._send_json(404, {'error': f"{self.path} は存在しません"})
+            return
+        self._send_json(200, {'status': 'ok', 'workers': self.server.workers, 'rules': self.server.fingerprint})
+
+    def do_POST(self):
+        if self.path != '/proofread':
+            self._send_json(404, {'error': f"{self.path} は存在しません"})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0:
+            self._send_json(411, {'error': "Content-Lengthを指定してください"})
+            return
+        if length > self.server.max_bytes:
+            self._send_json(413, {'error': f"{self.server.max_bytes} バイトを超えるファイルは受け付けません"})
+            return
+        body = self.rfile.read(length)
+
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            if self.server.path_root is None:
+                self._send_json(403, {'error': "パスを指定した校閲は無効です(サーバーの起動時に--path-rootを指定してください)"})
+                return
+            try:
+                paths = json.loads(body)
+                request = {'input': paths['input'], 'output': paths['output']}
+            except (ValueError, TypeError, KeyError):
+                request = None
+            if request is None or not all(isinstance(path, str) and path for path in request.values()):
+                self._send_json(400, {'error': "inputとoutputにパスの文字列を含むJSONを指定してください"})
+                return
+            resolved = {name: self.server.resolve_path(path) for name, path in request.items()}
+            if None in resolved.values():
+                self._send_json(403, {'error': f"{self.server.path_root} の外のファイルは指定できません"})
+                return
+            request = resolved
+        else:
+            request = {'docx': body}
+
+        try:
+            result = self.server.proofread(request)
+        except Exception as e:
+            # 想定外の例外でも接続を切らず、エラーの内容を返す
+            self._send_json(500, {'error': f"校閲中にエラーが発生しました: {e}"})
+            return
+        if 'error' in result:
+            self._send_json(400, result)
+            return
+        if 'docx' in result:
+            result['docx'] = base64.b64encode(result['docx']).decode('ascii')
+        self._send_json(200, result)
+
+def parse_args():
+    """
+    コマンドライン引数を解析する
+    """
+    parser = argparse.ArgumentParser(description="全角・半角の校閲を常駐サーバーとして提供します。")
+    parser.add_argument('--host', default='127.0.0.1', help="待ち受けるアドレス(既定ではこのマシンからのみ接続できる)")
+    parser.add_argument('--port', type=int, default=8765, help="待ち受けるポート番号")
+    parser.add_argument('--workers', type=int, default=2, metavar='N',
+                        help="校閲を行うワーカープロセスの数(0の場合はサーバーのプロセス内で処理する)")
+    parser.add_argument('--text-cache-size', type=int, default=conversion_cache.maxsize, metavar='N',
+                        help="ワーカーごとに同じテキストの変換結果を最大N件までキャッシュする(0で無効)")
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help="校閲済みパーツをDIRにキャッシュし、内容が変わっていないパーツの再校閲を省略する")
+    parser.add_argument('--path-root', metavar='DIR',
+                        help="DIR内のファイルをパスで指定した校閲を受け付ける(省略時は.docxの内容を送る校閲のみ)")
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / (1 << 20),
+                        help="受け付ける.docxファイルの最大サイズ(MB)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = ProofreadServer((args.host, args.port), workers=args.workers, cache_dir=args.cache_dir,
+                             text_cache_size=args.text_cache_size, max_bytes=int(args.max_mb * (1 << 20)),
+                             path_root=args.path_root)
+    print(f"http://{args.host}:{args.port}/proofread で校閲を受け付けています(ワーカー {args.workers})。")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+from batch_process import proofread_batch
+from make_xml_from_wordfile import get_docx_files
+from process import namespaces
+
+CONTENT_TYPES = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                 '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                 '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                 '<Default Extension="xml" ContentType="application/xml"/>'
+                 '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.'
+                 'wordprocessingml.document.main+xml"/></Types>')
+RELATIONSHIPS = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                 '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                 '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+                 'officeDocument" Target="word/document.xml"/></Relationships>')
+
+def make_docx(path, text):
+    """
+    1つの段落だけを含むwordファイルを作成する
+    """
+    document = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<w:document xmlns:w="{namespaces["w"]}"><w:body><w:p><w:r><w:t>{text}</w:t></w:r></w:p>'
+                f'</w:body></w:document>')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr('[Content_Types].xml', CONTENT_TYPES)
+        docx.writestr('_rels/.rels', RELATIONSHIPS)
+        docx.writestr('word/document.xml', document)
+
+def corrupt_document_part(path):
+    """
+    word/document.xmlの圧縮データの先頭を壊す(読み込むとzlib.errorになる)
+    """
+    with zipfile.ZipFile(path) as docx:
+        info = docx.getinfo('word/document.xml')
+    with open(path, 'r+b') as f:
+        f.seek(info.header_offset + 26)
+        name_length = int.from_bytes(f.read(2), 'little')
+        extra_length = int.from_bytes(f.read(2), 'little')
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        f.write(b'\xff' * 8)
+
+class ProofreadBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = os.path.join(self.temp_dir.name, 'data')
+        self.output_dir = os.path.join(self.temp_dir.name, 'output')
+        os.makedirs(self.data_dir)
+        make_docx(os.path.join(self.data_dir, 'a.docx'), 'ＡＢＣ')
+        make_docx(os.path.join(self.data_dir, 'b.docx'), 'ＤＥＦ')
+        corrupt_document_part(os.path.join(self.data_dir, 'a.docx'))
+        self.docx_files = [os.path.join(self.data_dir, name) for name in ('a.docx', 'b.docx')]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def assert_corrupt_file_recorded(self, **options):
+        log_filename = os.path.join(self.temp_dir.name, 'log.txt')
+        results = proofread_batch(self.docx_files, self.data_dir, self.output_dir, log_filename, **options)
+        self.assertEqual([result['input'] for result in results], self.docx_files)
+        self.assertIn('error', results[0])
+        self.assertNotIn('error', results[1])
+        self.assertTrue(os.path.exists(results[1]['output']))
+        with open(log_filename, encoding='utf-8') as f:
+            self.assertIn("合計: 2 ファイル (失敗 1)", f.read())
+
+    def test_previous_outputs_and_temporary_files_are_not_proofread(self):
+        make_docx(os.path.join(self.data_dir, '【校閲ずみ】b.docx'), 'ＤＥＦ')
+        make_docx(os.path.join(self.data_dir, '~$b.docx'), 'ＤＥＦ')
+        self.assertEqual(get_docx_files(self.data_dir), self.docx_files)
+
+    def test_corrupt_file_does_not_stop_the_batch(self):
+        self.assert_corrupt_file_recorded()
+
+    def test_corrupt_file_does_not_stop_the_parallel_batch(self):
+        self.assert_corrupt_file_recorded(jobs=2)
+
+    def test_spawned_workers_receive_the_rules(self):
+        rules = [{'name': '表記の統一', 'pattern': 'ＤＥＦ', 'replace': 'ghi', 'check_japanese': False}]
+        docx_files = self.docx_files[1:] * 2
+        with mock.patch('process.multiprocessing.get_context', return_value=multiprocessing.get_context('spawn')):
+            results = proofread_batch(docx_files, self.data_dir, self.output_dir,
+                                      os.path.join(self.temp_dir.name, 'log.txt'), rules=rules, jobs=2)
+        with zipfile.ZipFile(results[0]['output']) as docx:
+            self.assertIn('ghi', docx.read('word/document.xml').decode('utf-8'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from lxml import etree as ET
+from coalesce_runs import coalesce_runs
+
+W = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+def parse_paragraph(xml):
+    return ET.fromstring(f'<w:p xmlns:w="{W}">{xml}</w:p>')
+
+def child_names(paragraph):
+    return [ET.QName(child).localname for child in paragraph]
+
+class CoalesceRunsTest(unittest.TestCase):
+
+    def test_merges_runs_that_differ_only_in_rsid(self):
+        paragraph = parse_paragraph(
+            '<w:r w:rsidR="001"><w:rPr><w:b/></w:rPr><w:t>ＡＢ</w:t></w:r>'
+            '<w:proofErr w:type="spellStart"/>'
+            '<w:r w:rsidR="002"><w:rPr><w:b/></w:rPr><w:t xml:space="preserve">Ｃ </w:t></w:r>'
+            '<w:proofErr w:type="spellEnd"/>')
+        stats = coalesce_runs(paragraph)
+        self.assertEqual(stats, {'runs_checked': 2, 'runs_removed': 1, 'texts_removed': 1})
+        # まとめたランの間の<w:proofErr>のみ削除し、末尾のものは残す
+        self.assertEqual(child_names(paragraph), ['r', 'proofErr'])
+        text = paragraph.find(f'{{{W}}}r/{{{W}}}t')
+        self.assertEqual(text.text, 'ＡＢＣ ')
+        self.assertEqual(text.get('{http://www.w3.org/XML/1998/namespace}space'), 'preserve')
+
+    def test_keeps_runs_and_proof_errors_when_formats_differ(self):
+        paragraph = parse_paragraph(
+            '<w:r><w:rPr><w:b/></w:rPr><w:t>太字</w:t></w:r>'
+            '<w:proofErr w:type="spellStart"/>'
+            '<w:r><w:rPr><w:i/></w:rPr><w:t>斜体</w:t></w:r>'
+            '<w:r><w:rPr><w:i/></w:rPr><w:fldChar w:fldCharType="begin"/></w:r>')
+        stats = coalesce_runs(paragraph)
+        self.assertEqual(stats['runs_removed'], 0)
+        self.assertEqual(child_names(paragraph), ['r', 'proofErr', 'r', 'r'])
+
+    def test_merges_runs_inside_hyperlinks_separately(self):
+        paragraph = parse_paragraph(
+            '<w:r><w:t>前</w:t></w:r>'
+            '<w:hyperlink><w:r w:rsidR="001"><w:t>リン</w:t></w:r><w:r w:rsidR="002"><w:t>ク</w:t></w:r></w:hyperlink>'
+            '<w:r><w:t>後</w:t></w:r>')
+        stats = coalesce_runs(paragraph)
+        self.assertEqual(stats, {'runs_checked': 4, 'runs_removed': 1, 'texts_removed': 1})
+        self.assertEqual([''.join(run.itertext()) for run in paragraph.iter(f'{{{W}}}r')], ['前', 'リンク', '後'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+from paragraph_cache import ParagraphCache
+
+class ParagraphCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def open(self, docx_file='data/report.docx'):
+        return ParagraphCache.for_document(self.cache_dir, docx_file, 'rules', 'data')
+
+    def test_save_drops_paragraphs_not_seen_in_this_run(self):
+        cache = self.open()
+        with cache.part('document'):
+            cache.put('old', [], [])
+            cache.put('kept', [], [])
+        cache.save()
+
+        cache = self.open()
+        with cache.part('document'):
+            self.assertIsNotNone(cache.get('kept'))
+            cache.put('new', [], [])
+        cache.save()
+        self.assertEqual(set(self.open().previous), {'kept', 'new'})
+
+    def test_save_keeps_the_previous_run_when_the_cache_was_not_used(self):
+        cache = self.open()
+        with cache.part('document'):
+            cache.put('body', [], [])
+        cache.save()
+
+        # パーツを並列に変換した場合は、段落キャッシュを参照しない
+        self.open().save()
+        self.assertEqual(set(self.open().previous), {'body'})
+
+    def test_keep_part_carries_over_paragraphs_of_skipped_parts(self):
+        cache = self.open()
+        with cache.part('document'):
+            cache.put('body', [], [])
+        with cache.part('footer'):
+            cache.put('footer', [], [])
+        cache.save()
+
+        # 本文のみ校閲し、フッターはパーツキャッシュから再利用した場合
+        cache = self.open()
+        with cache.part('document-edited'):
+            cache.put('body-edited', [], [])
+        cache.keep_part('footer')
+        cache.save()
+
+        cache = self.open()
+        self.assertEqual(set(cache.previous), {'body-edited', 'footer'})
+        self.assertEqual(cache.previous_parts, {'document-edited': ['body-edited'], 'footer': ['footer']})
+
+    def test_documents_with_the_same_name_in_different_directories_are_separate(self):
+        first = self.open(os.path.join('data', 'a', 'report.docx'))
+        second = self.open(os.path.join('data', 'b', 'report.docx'))
+        self.assertNotEqual(first.path, second.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import multiprocessing
+import unittest
+from unittest import mock
+from lxml import etree as ET
+import process
+from change_log import ChangeRecordBuffer
+from process import (conversion_rules, namespaces, process_runs_in_paragraph, proofread_parts_parallel,
+                     worker_context)
+
+W = namespaces['w']
+
+def make_paragraph(*runs):
+    """
+    (テキスト, 太字かどうか)のリストから段落の要素を作成する
+    """
+    xml = ''.join(f"<w:r>{'<w:rPr><w:b/></w:rPr>' if bold else ''}<w:t>{text}</w:t></w:r>" for text, bold in runs)
+    return ET.fromstring(f'<w:p xmlns:w="{W}">{xml}</w:p>')
+
+def run_texts(paragraph):
+    return [''.join(run.itertext()) for run in paragraph.findall('w:r', namespaces)]
+
+class ProcessRunsInParagraphTest(unittest.TestCase):
+
+    def test_converted_characters_stay_in_their_own_runs(self):
+        # カッコの校閲は3つのランにまたがるが、置換前後で長さが変わらないため各ランの文字数は変わらない
+        paragraph = make_paragraph(('型番（', False), ('ａｂ１', True), ('）です', False))
+        log = ChangeRecordBuffer()
+        self.assertTrue(process_runs_in_paragraph(paragraph, log, conversion_rules))
+        self.assertEqual(run_texts(paragraph), ['型番(', 'ab1', ')です'])
+        bold_run = paragraph.findall('w:r', namespaces)[1]
+        self.assertIsNotNone(bold_run.find('w:rPr/w:b', namespaces))
+        self.assertEqual([(record['run'], record['before'], record['after']) for record in log.records],
+                         [(0, '型番（', '型番('), (1, 'ａｂ１', 'ab1'), (2, '）です', ')です')])
+        # 継続部分には、そのランに割り当てた置換後の文字列を記録する
+        self.assertEqual([match['replacement'] for record in log.records for match in record['matches']],
+                         ['(', 'ab1', ')'])
+
+    def test_length_changing_replacement_goes_to_the_starting_run(self):
+        rules = [{'name': '型番の表記', 'pattern': r'型番（(\w+)）', 'replace': r'型番 \1', 'check_japanese': False}]
+        paragraph = make_paragraph(('型番（', False), ('ab1', True), ('）です', False))
+        self.assertTrue(process_runs_in_paragraph(paragraph, ChangeRecordBuffer(), rules))
+        self.assertEqual(run_texts(paragraph), ['型番 ab1', '', 'です'])
+
+class ProofreadPartsParallelTest(unittest.TestCase):
+    # 既定のルールでは変換されない文字列を置き換えるルール
+    rules = [{'name': '表記の統一', 'pattern': 'いただく', 'replace': '頂く', 'check_japanese': False}]
+
+    def make_parts(self):
+        return [f'<w:document xmlns:w="{W}"><w:body><w:p><w:r><w:t>ご確認いただく{i}</w:t></w:r></w:p></w:body>'
+                f'</w:document>'.encode('utf-8') for i in range(3)]
+
+    def assert_custom_rules_applied(self, results):
+        self.assertEqual(len(results), 3)
+        for i, data in enumerate(results):
+            self.assertIn(f'ご確認頂く{i}', data.decode('utf-8'))
+
+    def test_workers_use_the_given_rules(self):
+        self.assert_custom_rules_applied(
+            proofread_parts_parallel(self.make_parts(), ChangeRecordBuffer(), self.rules, jobs=2))
+
+    def test_spawned_workers_receive_the_rules(self):
+        # macOS・Windowsの既定(spawn)では、ルールはプールの初期化時の引数として渡す
+        with mock.patch('process.multiprocessing.get_context', return_value=multiprocessing.get_context('spawn')):
+            self.assert_custom_rules_applied(
+                proofread_parts_parallel(self.make_parts(), ChangeRecordBuffer(), self.rules, jobs=2))
+        self.assertIs(process._part_worker_rules, conversion_rules)
+
+    def test_unpicklable_rules_are_applied_sequentially(self):
+        rules = [{**self.rules[0], 'replace': lambda match: '頂く'}]
+        self.assertIsNone(worker_context(rules))
+        self.assertIsNotNone(worker_context(conversion_rules))
+        self.assert_custom_rules_applied(
+            proofread_parts_parallel(self.make_parts(), ChangeRecordBuffer(), rules, jobs=2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import random
+import unittest
+from functools import reduce
+from process import apply_conversion_rule, conversion_rules
+from rule_engine import compile_rules, rules_fingerprint
+
+# 既定のルールが対象とする文字と、対象外の文字(日本語・空白など)を混ぜた文字集合
+ALPHABET = list('()（）ａｂｚＡＺ０９09azAZ．.-－！＂＃＄＆＇＊＜＞＠［＼］＾＿｀｛｜｝／~:%+*÷=あア漢 　ー々‐')
+
+# 置換前後で長さが変わるルールを含む独自のルール
+LENGTH_CHANGING_RULES = [
+    {'name': '型番の表記', 'pattern': r'型番（(\w+)）', 'replace': r'型番 \1', 'check_japanese': False},
+    {'name': '全角カッコの削除', 'pattern': r'（([a-z]+)）', 'replace': r'\1', 'check_japanese': True},
+    {'name': '記号の展開', 'pattern': '[%＆]', 'replace': lambda match: {'%': 'パーセント', '＆': 'と'}[match.group()],
+     'check_japanese': False},
+    {'name': '長音の統一', 'pattern': 'ー+', 'replace': 'ー', 'check_japanese': False},
+    {'name': '全角英数字を半角に変換', 'pattern': '[ａ-ｚ０-９]',
+     'replace': lambda match: chr(ord(match.group()) - 0xFEE0), 'check_japanese': True},
+]
+
+def apply_sequentially(text, rules):
+    """
+    ルールを1つずつ順に適用した結果(期待値)を返す
+    """
+    return reduce(apply_conversion_rule, rules, text)
+
+def random_texts(alphabet, count, seed):
+    """
+    (テキスト, テキストを分割したリスト)を乱数で作成する
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 16)))
+        cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 4))))
+        yield text, [text[start:end] for start, end in zip([0, *cuts], [*cuts, len(text)])]
+
+class CompiledRulesTest(unittest.TestCase):
+
+    def assert_same_as_sequential(self, rules, alphabet):
+        engine = compile_rules(rules)
+        for text, segments in random_texts(alphabet, 3000, seed=3):
+            expected = apply_sequentially(text, rules)
+            self.assertEqual(engine.apply(text), expected, text)
+            results = engine.convert_segments(segments)
+            self.assertEqual(len(results), len(segments))
+            self.assertEqual(''.join(converted for converted, _ in results), expected, segments)
+
+    def test_shipped_rules_match_sequential_application(self):
+        self.assert_same_as_sequential(conversion_rules, ALPHABET)
+
+    def test_length_changing_rules_match_sequential_application(self):
+        self.assert_same_as_sequential(LENGTH_CHANGING_RULES, ALPHABET + ['型番', 'abc', '（型番'])
+
+class RulesFingerprintTest(unittest.TestCase):
+    # 入れ子の関数・内包表記を含む置換処理(コードオブジェクトのreprにはアドレスが含まれる)
+    source = ("[{'name': '大文字', 'pattern': '[a-z]+', 'check_japanese': False,"
+              " 'replace': lambda match: ''.join(char.upper() for char in match.group())}]")
+
+    def test_nested_code_does_not_change_the_fingerprint(self):
+        # 同じソースから別々に作成したルール(コードオブジェクトは別のアドレスになる)
+        self.assertEqual(rules_fingerprint(eval(self.source)), rules_fingerprint(eval(self.source)))
+
+    def test_nested_code_changes_are_detected(self):
+        self.assertNotEqual(rules_fingerprint(eval(self.source)),
+                            rules_fingerprint(eval(self.source.replace('upper', 'lower'))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+from server import ProofreadServer
+from tests.test_batch_process import make_docx
+
+class ServerTestCase(unittest.TestCase):
+    # パスを指定した校閲を受け付けるかどうか
+    allow_paths = True
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.temp_dir.name, 'root')
+        os.makedirs(self.root)
+        self.server = ProofreadServer(('127.0.0.1', 0), workers=0, path_root=self.root if self.allow_paths else None)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/proofread'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.temp_dir.cleanup()
+
+    def post_json(self, body):
+        """
+        JSONを送り、(ステータスコード, 返されたJSON)を返す
+        """
+        request = urllib.request.Request(self.url, data=json.dumps(body).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as e:
+            return e.code, json.load(e)
+
+class PathRequestTest(ServerTestCase):
+
+    def test_paths_must_be_strings(self):
+        for body in ({'input': 'x.docx', 'output': None}, {'input': ['x.docx'], 'output': 'y.docx'}, ['x.docx']):
+            status, result = self.post_json(body)
+            self.assertEqual(status, 400, body)
+            self.assertIn('error', result)
+
+    def test_unexpected_errors_return_500(self):
+        with mock.patch('server.proofread_request', side_effect=ValueError('想定外')):
+            status, result = self.post_json({'input': 'x.docx', 'output': 'y.docx'})
+        self.assertEqual(status, 500)
+        self.assertIn('想定外', result['error'])
+
+    def test_paths_inside_the_root(self):
+        make_docx(os.path.join(self.root, 'x.docx'), 'ＡＢＣ')
+        status, result = self.post_json({'input': 'x.docx', 'output': 'y.docx'})
+        self.assertEqual(status, 200, result)
+        self.assertEqual(result['nodes_changed'], 1)
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'y.docx')))
+
+    def test_paths_outside_the_root_are_rejected(self):
+        outside = os.path.join(self.temp_dir.name, 'x.docx')
+        make_docx(outside, 'ＡＢＣ')
+        os.symlink(self.temp_dir.name, os.path.join(self.root, 'link'))
+        for body in ({'input': outside, 'output': 'y.docx'}, {'input': '../x.docx', 'output': 'y.docx'},
+                     {'input': 'link/x.docx', 'output': 'y.docx'}, {'input': 'link', 'output': '../y.docx'}):
+            status, result = self.post_json(body)
+            self.assertEqual(status, 403, body)
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), ['root', 'x.docx'])
+
+class PathRequestDisabledTest(ServerTestCase):
+    allow_paths = False
+
+    def test_paths_are_rejected_without_a_root(self):
+        make_docx(os.path.join(self.root, 'x.docx'), 'ＡＢＣ')
+        status, result = self.post_json({'input': os.path.join(self.root, 'x.docx'), 'output': 'y.docx'})
+        self.assertEqual(status, 403)
+        self.assertIn('error', result)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,294 @@
+"""
+このファイルではdataディレクトリを監視し、追加・更新された.docxファイルを順次校閲します。
+Linuxではinotifyで変更を検知し、使用できない環境では一定間隔でディレクトリを走査します。
+
+    python watch_folder.py --output-dir output --jobs 2
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import struct
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from batch_process import get_output_path, proofread_one
+from change_log import ChangeLogWriter
+from part_cache import PartCache
+from process import conversion_rules, worker_context, worker_rules
+from rule_engine import compile_rules
+
+# inotifyのイベント(linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')
+
+def is_target_docx(filename):
+    """
+    校閲対象の.docxファイルかどうか(Wordの一時ファイル・校閲済みファイルは除く)
+    """
+    return filename.endswith('.docx') and not filename.startswith(('~$', '【校閲ずみ】'))
+
+def scan_docx_files(data_dir):
+    """
+    ディレクトリ内(サブディレクトリを含む)の.docxファイルと、その(更新日時, サイズ)を返す
+    """
+    signatures = {}
+    for foldername, subfolders, filenames in os.walk(data_dir):
+        for filename in filenames:
+            if is_target_docx(filename):
+                file_path = os.path.join(foldername, filename)
+                signature = file_signature(file_path)
+                if signature is not None:
+                    signatures[file_path] = signature
+    return signatures
+
+def file_signature(file_path):
+    """
+    ファイルの(更新日時, サイズ)を返す(存在しない場合はNone)
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class PollingWatcher:
+    """
+    一定間隔でディレクトリを走査し、追加・更新されたファイルを検知する
+    """
+
+    def __init__(self, data_dir, interval=1.0):
+        self.data_dir = data_dir
+        self.interval = interval
+        self.signatures = scan_docx_files(data_dir)
+
+    def existing_files(self):
+        return list(self.signatures)
+
+    def changes(self, timeout):
+        """
+        前回の走査から追加・更新されたファイルのパスを返す
+        """
+        time.sleep(min(timeout, self.interval))
+        signatures = scan_docx_files(self.data_dir)
+        changed = {path for path, signature in signatures.items() if self.signatures.get(path) != signature}
+        self.signatures = signatures
+        return changed
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    """
+    inotify(ctypes経由)でディレクトリ内のファイルの作成・書き込み・移動を検知する
+    サブディレクトリも監視し、後から作成されたサブディレクトリは検知した時点で監視に加える
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotifyを初期化できませんでした")
+        self.directories = {}
+        for foldername, subfolders, filenames in os.walk(data_dir):
+            self._add_watch(foldername)
+
+    def _add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"{directory} を監視できませんでした")
+        self.directories[wd] = directory
+
+    def existing_files(self):
+        return list(scan_docx_files(self.data_dir))
+
+    def changes(self, timeout):
+        """
+        timeout秒以内に作成・書き込み・移動されたファイルのパスを返す
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # イベントが溢れた場合は全てのファイルを確認し直す
+                changed.update(scan_docx_files(self.data_dir))
+                continue
+            directory = self.directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_watch(path)
+                    # 監視を始める前に作成されたファイルも対象にする
+                    changed.update(scan_docx_files(path))
+            elif is_target_docx(name):
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+def create_watcher(data_dir, poll=False, interval=1.0):
+    """
+    inotifyが使用できる場合はInotifyWatcherを、それ以外はPollingWatcherを返す
+    """
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(data_dir)
+        except (OSError, AttributeError) as e:
+            print(f"inotifyを使用できないため、{interval} 秒ごとの走査で監視します: {e}")
+    return PollingWatcher(data_dir, interval)
+
+# ワーカープロセスで使用するルール(ワーカーの起動時に_init_workerで設定する)
+_worker_rules = conversion_rules
+
+def _init_worker(rules):
+    """
+    ワーカープロセスの起動時に、使用するルールを設定してコンパイルしておく
+    """
+    global _worker_rules
+    # Ctrl+Cは親プロセスで受け取り、実行中の校閲は最後まで行う
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_rules = conversion_rules if rules is None else rules
+    compile_rules(_worker_rules)
+
+def _proofread_in_worker(task):
+    """
+    ワーカープロセスで1つのwordファイルを校閲し、出力ファイルと同じ場所にログを書き込む
+    """
+    docx_file, output_docx, stream, cache_dir, log_format = task
+    log_filename = os.path.splitext(output_docx)[0] + ('_log.jsonl' if log_format == 'jsonl' else '_log.txt')
+    try:
+        part_cache = PartCache(cache_dir) if cache_dir else None
+        os.makedirs(os.path.dirname(output_docx) or '.', exist_ok=True)
+        with ChangeLogWriter(log_filename, log_format) as log_file:
+            return proofread_one(docx_file, output_docx, log_file, _worker_rules, stream, part_cache)
+    except Exception as e:
+        print(f"{docx_file} の校閲に失敗しました: {e}")
+        return {'error': str(e), 'input': docx_file, 'output': output_docx}
+
+def watch_folder(data_dir, output_dir, jobs=2, debounce=2.0, poll=False, interval=1.0, stream=False, cache_dir=None,
+                 log_format='text', process_existing=True):
+    """
+    data_dirを監視し、追加・更新された.docxファイルをjobs個のプロセスで校閲してoutput_dirに出力する
+    書き込み中のファイルを処理しないよう、最後の変更からdebounce秒経過し、
+    更新日時とサイズが変わらず、zipファイルとして読み込めるようになってから校閲する
+    (さらにdebounce秒待ってもzipファイルとして読み込めない場合は、壊れたファイルとして校閲に失敗を記録する)
+    """
+    if os.path.commonpath([os.path.abspath(output_dir), os.path.abspath(data_dir)]) == os.path.abspath(data_dir):
+        print("出力先にはdataディレクトリの外のディレクトリを指定してください")
+        return
+
+    watcher = create_watcher(data_dir, poll, interval)
+    pending = {}    # 校閲待ちのファイル: (最後に変更を検知した時刻, その時点の更新日時とサイズ, 読み込めず待った回数)
+    processed = {}  # 校閲したファイル: 校閲した時点の更新日時とサイズ
+    running = {}    # 実行中のタスク: (ファイル, 校閲を始めた時点の更新日時とサイズ)
+    if process_existing:
+        for path in watcher.existing_files():
+            pending[path] = (0.0, file_signature(path), 0)
+    print(f"{data_dir} を監視しています(出力先: {output_dir}、Ctrl+Cで終了)。")
+
+    try:
+        # ワーカーはプラットフォームの既定の方法で起動する(このプロセスではログを書き込むスレッドを開始しない)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(worker_rules(conversion_rules),),
+                                 mp_context=worker_context(conversion_rules)) as executor:
+            while True:
+                for path in watcher.changes(timeout=min(debounce, interval) if pending or running else interval):
+                    pending[path] = (time.monotonic(), file_signature(path), 0)
+
+                # 終了したタスクの結果を表示する
+                for future in [future for future in running if future.done()]:
+                    path, signature = running.pop(future)
+                    # 失敗したファイルも校閲済みとして記録し、更新されるまで再試行しない
+                    processed[path] = signature
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"{path} の校閲に失敗しました: {e}")
+                        continue
+                    if 'error' not in result:
+                        print(f"{path} を校閲し、{result['output']} に出力しました"
+                              f"(変更 {result['nodes_changed']} ノード, {result['seconds']:.2f} 秒)。")
+
+                # 書き込みが終わったファイルを、空いているワーカーの数だけ投入する
+                now = time.monotonic()
+                running_paths = {path for path, _ in running.values()}
+                for path, (changed_at, signature, retries) in list(pending.items()):
+                    if len(running) >= jobs:
+                        break
+                    if now - changed_at < debounce or path in running_paths:
+                        continue
+                    current = file_signature(path)
+                    if current is None or current == processed.get(path):
+                        # 削除されたファイル・校閲済みのファイルは対象外
+                        del pending[path]
+                        continue
+                    if current != signature:
+                        # まだ書き込み中とみなし、改めて待つ
+                        pending[path] = (now, current, 0)
+                        continue
+                    if retries == 0 and not zipfile.is_zipfile(path):
+                        pending[path] = (now, current, 1)
+                        continue
+                    del pending[path]
+                    task = (path, get_output_path(path, data_dir, output_dir), stream, cache_dir, log_format)
+                    running[executor.submit(_proofread_in_worker, task)] = (path, current)
+                    running_paths.add(path)
+
+                if running and not pending:
+                    wait(list(running), timeout=interval, return_when=FIRST_COMPLETED)
+    except KeyboardInterrupt:
+        print("監視を終了しました。")
+    finally:
+        watcher.close()
+
+def parse_args():
+    """
+    コマンドライン引数を解析する
+    """
+    parser = argparse.ArgumentParser(description="dataディレクトリを監視し、追加・更新された.docxファイルを校閲します。")
+    parser.add_argument('--data-dir', default='data', help="監視するディレクトリ")
+    parser.add_argument('--output-dir', default='output', help="校閲したファイルの出力先(dataディレクトリの外)")
+    parser.add_argument('--jobs', type=int, default=2, metavar='N', help="同時に校閲するファイル数(プロセス数)")
+    parser.add_argument('--debounce', type=float, default=2.0, metavar='SEC',
+                        help="最後の変更からSEC秒経過したファイルを書き込み完了とみなす")
+    parser.add_argument('--poll', action='store_true', help="inotifyを使用せず、一定間隔の走査で監視する")
+    parser.add_argument('--interval', type=float, default=1.0, metavar='SEC', help="走査で監視する場合の間隔")
+    parser.add_argument('--skip-existing', action='store_true', help="監視開始時に既にあるファイルは校閲しない")
+    parser.add_argument('--stream', action='store_true',
+                        help="XML全体を読み込まず、段落単位で変換・書き出しを行う(巨大な文書向け)")
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help="校閲済みパーツをDIRにキャッシュし、内容が変わっていないパーツの再校閲を省略する")
+    parser.add_argument('--log-format', choices=['text', 'jsonl'], default='text', help="変更記録のログ形式")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    watch_folder(args.data_dir, args.output_dir, jobs=args.jobs, debounce=args.debounce, poll=args.poll,
+                 interval=args.interval, stream=args.stream, cache_dir=args.cache_dir, log_format=args.log_format,
+                 process_existing=not args.skip_existing)